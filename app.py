@@ -1,8 +1,10 @@
 import gradio as gr
+import asyncio
 import time
 import os
+import uuid
 from dotenv import load_dotenv
-from logger_config import setup_logger, get_logger
+from logger_config import setup_logger, get_logger, bind_session
 
 # 1. Setup Professional Logging (Must be first)
 setup_logger()
@@ -17,9 +19,19 @@ logger.info("System initializing...")
 
 from story_engine import StoryTeller
 from media_engine import MediaEngine
-from character_engine import CharacterEngine, Character
+from character_engine import CharacterEngine
+from session_model import SessionState, Character
 from moral_engine import MoralEngine
 from emotion_engine import EmotionEngine
+from qos_controller import QoSController, QoSLevel
+from scene_change import SceneChangeDetector, scene_signature
+from media_store import media_store
+from story_cache import StoryCache
+from llm_scheduler import llm_scheduler
+from single_flight import llm_single_flight
+from image_pipeline import image_pipeline
+from stats_reporter import stats_reporter
+from config import UI_CONCURRENCY_LIMIT, MEDIA_SWEEP_INTERVAL, MEDIA_MAX_AGE
 
 # Load environment variables
 load_dotenv()
@@ -32,6 +44,19 @@ if not os.getenv("GOOGLE_API_KEY"):
 story_teller = StoryTeller()
 media_engine = MediaEngine()
 character_engine = CharacterEngine()
+# Scoring is stateless per call, so one engine (and one ChatGroq client) serves all sessions
+moral_engine = MoralEngine()
+qos = QoSController()
+# Openings pre-generated by batch_generate.py, if a cache file exists
+story_cache = StoryCache.open_existing()
+if story_cache:
+    logger.info(f"Warm cache loaded: {story_cache.count()} pre-generated openings")
+scene_detector = SceneChangeDetector()
+# Periodic capacity figures in the log (STATS_LOG_INTERVAL)
+stats_reporter.register("llm_scheduler", llm_scheduler.get_stats)
+stats_reporter.register("single_flight", llm_single_flight.get_stats)
+stats_reporter.register("image_pipeline", image_pipeline.get_stats)
+stats_reporter.register("story_output", story_teller.validator.get_stats)
 try:
     emotion_engine = EmotionEngine()
     if emotion_engine.detector is None:
@@ -42,53 +67,77 @@ except Exception as e:
 
 logger.info("Engine validation complete. Launching UI...")
 
-def start_story_handler(theme, language, history_state):
+async def start_story_handler(theme, language, history_state):
     try:
         if not theme:
             yield "Please enter a theme.", None, None, history_state, "", ""
             return
-        
-        # Initialize Character & Moral Engine
-        char_name = f"Protagonist_{theme.split()[0]}"
-        character = character_engine.initialize_character(char_name, theme)
-        moral = MoralEngine()
 
-        # Start Story (Returns JSON dict)
-        story_data = story_teller.start_story(theme, language)
+        # Load shedding decision for this turn
+        turn_start = time.time()
+        qos_level = qos.evaluate()
+        status_msg = qos.status_message(qos_level)
+        session_id = uuid.uuid4().hex
+        bind_session(session_id)
+        # A new journey replaces the previous one in this browser tab; free its media
+        if isinstance(history_state, SessionState):
+            await asyncio.to_thread(media_store.drop_session, history_state.session_id)
+
+        cached = await asyncio.to_thread(story_cache.get, theme, language) if story_cache else None
+        if cached:
+            # Warm path: identity, knowledge block and opening were generated offline
+            logger.info(f"Warm cache hit for '{theme}' ({language})")
+            character = Character.from_dict(cached["character"])
+            story_data = cached["story_data"]
+            history = cached["history"]
+        else:
+            # Initialize Character
+            char_name = f"Protagonist_{theme.split()[0]}"
+            character = await character_engine.ainitialize_character(char_name, theme)
+
+            # Start Story (Returns JSON dict) on a per-session view of the shared StoryTeller
+            session_teller = story_teller.fork(language=language)
+            story_data = await session_teller.astart_story(theme, language)
+            history = session_teller.export_history()
+
+        session = SessionState(session_id, character, language)
+        session.set_history(history)
+        moral_display = session.scores.display()
+
         story_text = story_data.get("story_text", "")
         emotion = story_data.get("emotion", "neutral")
         visual_keywords = story_data.get("visual_keywords")
         
         # Immediate yield: Story Text
-        yield story_text, None, None, {
-            "character": character.to_dict(), 
-            "moral_scores": moral.scores
-        }, "Compassion: 0 | Courage: 0 | Greed: 0", ""
-
-        # Generate Audio
-        audio = media_engine.generate_audio(story_text)
-        yield story_text, audio, None, {
-            "character": character.to_dict(), 
-            "moral_scores": moral.scores
-        }, "Compassion: 0 | Courage: 0 | Greed: 0", ""
-
-        # Generate Image (Optimized)
-        char_desc = character_engine.get_visual_description(character)
-        media_path, media_type = media_engine.generate_scene(story_text, emotion, char_desc, visual_keywords_bypass=visual_keywords)
-        
-        image_update = gr.update(value=media_path, visible=True) if media_type == "image" else gr.update(visible=False)
-
-        yield (
-            story_text, 
-            audio, 
-            image_update,
-            {
-                "character": character.to_dict(), 
-                "moral_scores": moral.scores
-            },
-            f"Compassion: 0 | Courage: 0 | Greed: 0",
-            "" # Status msg
-        )
+        yield story_text, None, None, session, moral_display, status_msg
+
+        # Generate Audio (shed under QoS pressure)
+        audio = None
+        if qos_level < QoSLevel.NO_AUDIO:
+            audio = await media_engine.agenerate_audio(story_text, session_id=session_id)
+            yield story_text, audio, None, session, moral_display, status_msg
+
+        # Generate Image (Optimized, shed under QoS pressure)
+        image_update = gr.update(visible=False)
+        session.last_scene = {"signature": scene_signature(story_text, emotion, visual_keywords), "image": None}
+        if qos_level < QoSLevel.NO_IMAGES:
+            if cached and cached.get("image"):
+                # Already encoded locally, so no placeholder round trip is needed
+                media_path, media_type = await media_engine.astore_scene(session_id, cached["image"], cached["image_ext"])
+            else:
+                char_desc = character_engine.get_visual_description(character)
+                async for media_type, media_path in media_engine.astream_scene(story_text, emotion, char_desc, visual_keywords_bypass=visual_keywords, session_id=session_id):
+                    if media_type == "preview":
+                        # Placeholder while the full image is still being transcoded
+                        yield story_text, audio, gr.update(value=media_path, visible=True), session, moral_display, status_msg
+            if media_path is not None:
+                image_update = gr.update(value=media_path, visible=True)
+                # Only a file reference goes into gr.State; in-memory images are never kept there
+                session.last_scene["image"] = media_path if isinstance(media_path, str) else None
+
+        qos.record_latency(time.time() - turn_start)
+
+        yield story_text, audio, image_update, session, moral_display, status_msg
 
     except Exception as e:
         logger.error(f"Error in start_story_handler: {e}")
@@ -119,26 +168,28 @@ def process_emotion_stream(image, last_time):
     return "neutral", current_time
 
 
-def continue_story_handler(user_choice, user_emotion_label, state):
+async def continue_story_handler(user_choice, user_emotion_label, state):
     try:
         if not user_choice:
             yield "Please make a choice.", None, None, state, "", ""
             return
 
-        # Rehydrate State
-        if not state:
+        # Session lives in gr.State as a SessionState; nothing to rebuild per turn
+        if not isinstance(state, SessionState):
             yield "Session expired. Start over.", None, None, None, "", ""
             return
-        
-        character = Character.from_dict(state["character"])
-        moral = MoralEngine()
-        moral.scores = state["moral_scores"]
 
-        # 1. Score the Choice
-        moral_result = moral.score_choice(user_choice, story_teller.history[-1].content)
+        session = state
+        bind_session(session.session_id)
+        turn_start = time.time()
+        qos_level = qos.evaluate()
+        character = session.character
+
+        # 1. Score the Choice (shared engine, per-session scores)
+        moral_result = await moral_engine.ascore_choice(user_choice, session.last_story_text(), session.scores) or {}
         
         # 2. Update Character Traits
-        character = character_engine.update_traits_from_scores(character, moral.scores)
+        character_engine.update_traits_from_scores(character, session.scores)
 
         # 3. Continue Story (Returns JSON)
         # Use the passed-in emotion label (from State)
@@ -146,39 +197,59 @@ def continue_story_handler(user_choice, user_emotion_label, state):
         # Inject into context
         context_choice = f"{user_choice} (User Facial Emotion: {user_emotion_label})"
         
-        story_data = story_teller.continue_story(context_choice)
+        session_teller = story_teller.fork(session.history_records(), session.language)
+        story_data = await session_teller.acontinue_story(context_choice, brief=qos_level >= QoSLevel.REDUCED)
+        session.set_history(session_teller.export_history())
         story_text = story_data.get("story_text", "")
         # Blend Emotions: Story > Facial
         story_emotion = story_data.get("emotion", "neutral")
         final_emotion = story_emotion if story_emotion != "neutral" else user_emotion_label
         visual_keywords = story_data.get("visual_keywords")
         
-        moral_display = f"Compassion: {moral.scores['compassion']} | Courage: {moral.scores['courage']} | Greed: {moral.scores['greed']}"
+        moral_display = session.scores.display()
         
         status_msg = f"✨ Karma Updated! (Compassion: {moral_result.get('compassion')}, Courage: {moral_result.get('courage')}, Greed: {moral_result.get('greed')}) | Face: {user_emotion_label}"
+        if qos_level > QoSLevel.NORMAL:
+            status_msg += f" | {qos.status_message(qos_level)}"
 
         # Yield Text immediately
-        yield story_text, None, None, state, moral_display, status_msg
+        yield story_text, None, None, session, moral_display, status_msg
         
-        # 4. Generate Audio
-        audio = media_engine.generate_audio(story_text)
-        yield story_text, audio, None, state, moral_display, status_msg
-
-        # 5. Generate Media
-        char_desc = character_engine.get_visual_description(character)
-        media_path, media_type = media_engine.generate_scene(story_text, final_emotion, char_desc, visual_keywords_bypass=visual_keywords)
-        image_update = gr.update(value=media_path, visible=True) if media_type == "image" else gr.update(visible=False)
-
-        # Update State
-        state["moral_scores"] = moral.scores
-        state["character"] = character.to_dict()
+        # 4. Generate Audio (shed under QoS pressure)
+        audio = None
+        if qos_level < QoSLevel.NO_AUDIO:
+            audio = await media_engine.agenerate_audio(story_text, session_id=session.session_id)
+            yield story_text, audio, None, session, moral_display, status_msg
+
+        # 5. Generate Media (shed under QoS pressure, skipped when the scene barely changed)
+        image_update = gr.update(visible=False)
+        last_scene = session.last_scene
+        signature = scene_signature(story_text, final_emotion, visual_keywords)
+        if qos_level < QoSLevel.NO_IMAGES:
+            decision, _ = scene_detector.decide(last_scene, signature)
+            if decision == SceneChangeDetector.REUSE:
+                # Keep the rendered scene's signature so gradual drift still triggers a re-render
+                image_update = gr.update(value=last_scene["image"], visible=True)
+            else:
+                char_desc = character_engine.get_visual_description(character)
+                async for media_type, media_path in media_engine.astream_scene(
+                    story_text, final_emotion, char_desc, visual_keywords_bypass=visual_keywords,
+                    draft=decision == SceneChangeDetector.VARIANT, session_id=session.session_id
+                ):
+                    if media_type == "preview":
+                        # Placeholder while the full image is still being transcoded
+                        yield story_text, audio, gr.update(value=media_path, visible=True), session, moral_display, status_msg
+                if media_path is not None:
+                    image_update = gr.update(value=media_path, visible=True)
+                session.last_scene = {"signature": signature, "image": media_path if isinstance(media_path, str) else None}
 
         # Check if story ended
         if "THE END" in story_text.upper():
-            reflection = moral.generate_reflection()
+            reflection = await moral_engine.agenerate_reflection(session.scores)
             story_text += f"\n\n✨ **Moral Reflection**: {reflection}"
 
-        yield story_text, audio, image_update, state, moral_display, status_msg
+        qos.record_latency(time.time() - turn_start)
+        yield story_text, audio, image_update, session, moral_display, status_msg
 
     except Exception as e:
         logger.error(f"Error in continue_story_handler: {e}")
@@ -186,8 +257,9 @@ def continue_story_handler(user_choice, user_emotion_label, state):
 
 
 # Gradio Interface
-with gr.Blocks(title="Smart Cultural Storyteller") as demo:
-    state = gr.State({})
+# Gradio keeps its own copy of every returned file; expire those like the media store's
+with gr.Blocks(title="Smart Cultural Storyteller", delete_cache=(MEDIA_SWEEP_INTERVAL, MEDIA_MAX_AGE)) as demo:
+    state = gr.State(None)
     # State to hold background emotion detection
     emotion_state = gr.State("neutral")
     # State to hold last processing timestamp for throttling
@@ -248,6 +320,10 @@ with gr.Blocks(title="Smart Cultural Storyteller") as demo:
         outputs=[story_display, audio_display, image_display, state, moral_info, status_info]
     )
 
+# Async handlers spend most of a turn awaiting I/O, so many sessions can share the event loop
+demo.queue(default_concurrency_limit=UI_CONCURRENCY_LIMIT)
+
 if __name__ == "__main__":
     logger.info("Starting Web Server at http://127.0.0.1:7860...")
-    demo.launch(theme=gr.themes.Soft(), quiet=True) # quiet to suppress some Gradio logs
+    stats_reporter.start()
+    demo.launch(theme=gr.themes.Soft(), quiet=True, allowed_paths=[media_store.root]) # quiet to suppress some Gradio logs
@@ -0,0 +1,21 @@
+import asyncio
+import threading
+
+_loop = None
+_loop_lock = threading.Lock()
+
+def _background_loop():
+    """One long-lived event loop for sync callers, so async clients stay bound to a single loop."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="storyteller-sync-bridge", daemon=True).start()
+        return _loop
+
+def run_sync(coro):
+    """
+    Runs a coroutine to completion from synchronous code.
+    Backs the thin sync wrappers around the async engine methods.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop()).result()
@@ -0,0 +1,166 @@
+"""
+Headless batch generation of story openings for a catalogue of themes.
+
+Usage:
+    python batch_generate.py themes.txt --languages English,Hindi --workers 4
+
+Each input line is `theme` or `theme | language`. Lines starting with '#' are
+ignored. Completed (theme, language) pairs already in the store are skipped, so
+an interrupted run resumes where it stopped. The resulting store is picked up by
+app.py as a warm cache.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from dotenv import load_dotenv
+from logger_config import setup_logger, get_logger, bind_session
+
+setup_logger()
+logger = get_logger()
+
+from config import STORY_CACHE_PATH, DEFAULT_LANGUAGE
+from story_engine import StoryTeller
+from culture_engine import CultureEngine, FALLBACK_CONTEXT
+from character_engine import CharacterEngine, FALLBACK_NAME
+from media_engine import MediaEngine
+from story_cache import StoryCache
+
+def read_jobs(path, languages):
+    """Parses the theme list into unique (theme, language) pairs, preserving order."""
+    jobs = []
+    seen = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if "|" in line:
+                theme, language = (part.strip() for part in line.split("|", 1))
+                pairs = [(theme, language or DEFAULT_LANGUAGE)]
+            else:
+                pairs = [(line, language) for language in languages]
+            for pair in pairs:
+                if pair not in seen:
+                    seen.add(pair)
+                    jobs.append(pair)
+    return jobs
+
+class BatchRunner:
+    def __init__(self, store, workers, with_images=True):
+        self.store = store
+        self.workers = workers
+        self.with_images = with_images
+        # Stateless engines are shared; StoryTeller holds history so each job gets its own
+        self.culture_engine = CultureEngine()
+        self.character_engine = CharacterEngine()
+        self.media_engine = MediaEngine() if with_images else None
+        self.done = 0
+        self.failed = 0
+        self.started = time.monotonic()
+
+    async def generate(self, theme, language):
+        bind_session(f"batch:{theme}:{language}")
+        # Engines swallow LLM failures into placeholder values; storing those would make the
+        # pair look done and serve the placeholder on every warm-cache hit, so fail the job instead
+        context_str = await self.culture_engine.aget_context_string(theme)
+        if context_str == FALLBACK_CONTEXT:
+            raise RuntimeError("culture lookup returned the fallback knowledge block")
+        character = await self.character_engine.ainitialize_character(f"Protagonist_{theme.split()[0]}", theme)
+        if character.name == FALLBACK_NAME:
+            raise RuntimeError("identity generation returned the fallback protagonist")
+
+        story_teller = StoryTeller(culture_engine=self.culture_engine)
+        story_data = await story_teller.astart_story(theme, language, context_str=context_str)
+        history = story_teller.export_history()
+        if history[-1][0] != "ai":
+            # astart_story fell back to placeholder text
+            raise RuntimeError("story generation returned the fallback opening")
+
+        image = image_ext = thumbnail = None
+        if self.media_engine:
+            char_desc = self.character_engine.get_visual_description(character)
+            try:
+                processed = await self.media_engine.arender_scene(
+                    story_data["story_text"], story_data.get("emotion", "neutral"), char_desc,
+                    visual_keywords_bypass=story_data.get("visual_keywords")
+                )
+                image, image_ext, thumbnail = processed.data, processed.ext, processed.thumbnail
+            except Exception as e:
+                # A missing image is acceptable; the app renders one live on a cache hit
+                logger.warning(f"Batch: image failed for '{theme}' ({language}): {e}")
+
+        payload = {
+            "story_data": story_data,
+            "context": context_str,
+            "character": character.to_dict(),
+            "history": history,
+        }
+        await asyncio.to_thread(self.store.put, theme, language, payload, image, image_ext, thumbnail)
+
+    async def _worker(self, queue, total):
+        while True:
+            try:
+                theme, language = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                await self.generate(theme, language)
+                self.done += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Batch: failed '{theme}' ({language}): {e}")
+            finished = self.done + self.failed
+            logger.info(f"Batch: {finished}/{total} processed | {self.throughput():.2f} stories/min")
+
+    def throughput(self):
+        minutes = (time.monotonic() - self.started) / 60
+        return self.done / minutes if minutes > 0 else 0.0
+
+    async def run(self, jobs):
+        pending = [job for job in jobs if not self.store.has(*job)]
+        skipped = len(jobs) - len(pending)
+        if skipped:
+            logger.info(f"Batch: resuming, {skipped} of {len(jobs)} already in {self.store.path}")
+
+        queue = asyncio.Queue()
+        for job in pending:
+            queue.put_nowait(job)
+
+        self.started = time.monotonic()
+        try:
+            await asyncio.gather(*(self._worker(queue, len(pending)) for _ in range(min(self.workers, len(pending)) or 1)))
+        finally:
+            if self.media_engine:
+                await self.media_engine.aclose()
+        return skipped
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-generate story openings into a warm cache.")
+    parser.add_argument("themes", help="File with one 'theme' or 'theme | language' per line")
+    parser.add_argument("--languages", default=DEFAULT_LANGUAGE, help="Comma-separated languages for lines without one")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent stories in flight")
+    parser.add_argument("--store", default=STORY_CACHE_PATH, help="Output cache file")
+    parser.add_argument("--no-images", action="store_true", help="Skip scene images")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    languages = [lang.strip() for lang in args.languages.split(",") if lang.strip()]
+    jobs = read_jobs(args.themes, languages)
+    store = StoryCache(args.store)
+    runner = BatchRunner(store, max(1, args.workers), with_images=not args.no_images)
+
+    try:
+        skipped = asyncio.run(runner.run(jobs))
+    finally:
+        store.close()
+
+    elapsed = time.monotonic() - runner.started
+    logger.info(
+        f"Batch complete: {runner.done} generated, {runner.failed} failed, {skipped} skipped "
+        f"in {elapsed:.0f}s ({runner.throughput():.2f} stories/min)"
+    )
+    return 1 if runner.failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
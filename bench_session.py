@@ -0,0 +1,110 @@
+"""
+Benchmarks the compact session model against the legacy per-session representation.
+
+Usage:
+    python bench_session.py --sessions 10000 --turns 10
+
+Legacy: Character.to_dict() + moral_scores dict + a list of message objects,
+serialized as JSON. Compact: SessionState with byte-packed scores and
+(role_code, content) history tuples, serialized with to_bytes/from_bytes.
+"""
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+from session_model import SessionState, Character, MoralScores, TRAITS
+
+_WORDS = (
+    "river lantern temple monsoon elephant courtyard festival merchant drum "
+    "sandstone caravan silk banyan oath shadow market moon village elder"
+).split()
+
+class _Message:
+    """Stand-in for a langchain message: an object with a per-instance __dict__."""
+    def __init__(self, role, content):
+        self.type = role
+        self.content = content
+        self.additional_kwargs = {}
+        self.response_metadata = {}
+
+def _text(rng, words):
+    return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+def _records(rng, turns):
+    records = [("system", _text(rng, 120))]
+    for _ in range(turns):
+        records.append(("human", _text(rng, 12)))
+        records.append(("ai", json.dumps({"story_text": _text(rng, 80), "emotion": "joy", "visual_keywords": _text(rng, 6)})))
+    return records
+
+def build_compact(rng, i, turns):
+    character = Character(f"Protagonist_{i}", "Rajasthan", traits=["Kind", "Brave"])
+    session = SessionState(f"{i:032x}", character, "English", MoralScores([rng.randint(-10, 10) for _ in TRAITS]))
+    session.set_history(_records(rng, turns))
+    session.last_scene = {"signature": {"emotion": "joy", "keywords": ["river", "temple"], "story": ["lantern", "moon"]}, "image": f"media/{i}/scene.webp"}
+    return session
+
+def build_legacy(rng, i, turns):
+    character = Character(f"Protagonist_{i}", "Rajasthan", traits=["Kind", "Brave"])
+    return {
+        "character": character.to_dict(),
+        "moral_scores": {trait: rng.randint(-10, 10) for trait in TRAITS},
+        "session_id": f"{i:032x}",
+        "history": [_Message(role, content) for role, content in _records(rng, turns)],
+        "last_scene": {"signature": {"emotion": "joy", "keywords": ["river", "temple"], "story": ["lantern", "moon"]}, "image": f"media/{i}/scene.webp"},
+    }
+
+def legacy_dumps(state):
+    data = dict(state, history=[{"type": m.type, "content": m.content} for m in state["history"]])
+    return json.dumps(data).encode("utf-8")
+
+def legacy_loads(blob):
+    data = json.loads(blob)
+    data["character"] = Character.from_dict(data["character"])
+    data["history"] = [_Message(m["type"], m["content"]) for m in data["history"]]
+    return data
+
+def measure_memory(builder, count, turns):
+    """Average bytes allocated per live session, history text included."""
+    rng = random.Random(7)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = [builder(rng, i, turns) for i in range(count)]
+    total = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return sessions, total / count
+
+def timed(fn, items):
+    start = time.perf_counter()
+    out = [fn(item) for item in items]
+    return out, time.perf_counter() - start
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Session model memory and (de)serialization benchmark.")
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--turns", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    compact, compact_mem = measure_memory(build_compact, args.sessions, args.turns)
+    legacy, legacy_mem = measure_memory(build_legacy, args.sessions, args.turns)
+
+    blobs, compact_dump = timed(SessionState.to_bytes, compact)
+    restored, compact_load = timed(SessionState.from_bytes, blobs)
+    legacy_blobs, legacy_dump = timed(legacy_dumps, legacy)
+    _, legacy_load = timed(legacy_loads, legacy_blobs)
+
+    assert restored[0].history == compact[0].history and restored[0].scores.to_dict() == compact[0].scores.to_dict()
+
+    n = args.sessions
+    print(f"{n} sessions, {args.turns} turns each")
+    print(f"{'':14}{'legacy':>12}{'compact':>12}")
+    print(f"{'memory/session':14}{legacy_mem / 1024:>10.1f}KB{compact_mem / 1024:>10.1f}KB")
+    print(f"{'bytes/session':14}{sum(map(len, legacy_blobs)) / n:>12.0f}{sum(map(len, blobs)) / n:>12.0f}")
+    print(f"{'serialize':14}{legacy_dump * 1000:>10.0f}ms{compact_dump * 1000:>10.0f}ms")
+    print(f"{'deserialize':14}{legacy_load * 1000:>10.0f}ms{compact_load * 1000:>10.0f}ms")
+
+if __name__ == "__main__":
+    main()
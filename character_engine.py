@@ -1,60 +1,28 @@
-import random
-
-class Character:
-    def __init__(self, name, culture, age=20, traits=None, voice_id="21m00Tcm4TlvDq8ikWAM", face_seed=None):
-        self.id = f"char_{random.randint(1000, 9999)}"
-        self.name = name
-        self.culture = culture
-        self.age = age
-        self.traits = traits if traits else []
-        self.voice_id = voice_id
-        # Persistent seed for image generation consistency
-        self.face_seed = face_seed if face_seed else random.randint(10000, 99999)
-        
-    def add_trait(self, trait):
-        if trait not in self.traits:
-            self.traits.append(trait)
-
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "culture": self.culture,
-            "age": self.age,
-            "traits": self.traits,
-            "voice_id": self.voice_id,
-            "face_seed": self.face_seed
-        }
-
-    @staticmethod
-    def from_dict(data):
-        return Character(
-            name=data["name"],
-            culture=data["culture"],
-            age=data["age"],
-            traits=data["traits"],
-            voice_id=data["voice_id"],
-            face_seed=data["face_seed"]
-        )
-
+from session_model import Character
 from config import MODEL_FAST
 from langchain_groq import ChatGroq
 from langchain_core.output_parsers import JsonOutputParser
 from pydantic import BaseModel, Field
 from logger_config import get_logger
+from single_flight import llm_single_flight
+from llm_scheduler import llm_scheduler, Priority, estimate_tokens
+from async_utils import run_sync
 
 logger = get_logger()
 
+# Name given to the protagonist when identity generation fails
+FALLBACK_NAME = "Protagonist"
+
 class CharacterIdentity(BaseModel):
     name: str = Field(description="A culturally appropriate name for the protagonist")
     culture_label: str = Field(description="A formally normalized culture label (e.g., 'Indian Epic - Ramayana')")
 
 class CharacterEngine:
     def __init__(self):
-        self.llm = ChatGroq(model=MODEL_FAST)
+        self.llm = ChatGroq(model=MODEL_FAST, max_retries=0)
         self.parser = JsonOutputParser(pydantic_object=CharacterIdentity)
 
-    def _generate_identity_llm(self, theme_input):
+    async def _agenerate_identity_llm(self, theme_input):
         """Generates dynamic character identity using LLM."""
         try:
             prompt = (
@@ -63,17 +31,29 @@ class CharacterEngine:
                 "Example: 'samurai' -> Name: 'Kenji', Culture: 'Japanese History - Samurai Era'\n"
                 f"{self.parser.get_format_instructions()}"
             )
-            response = self.llm.invoke(prompt)
+            key = ("identity", MODEL_FAST, prompt)
+            response = await llm_single_flight.ado(key, lambda: llm_scheduler.arun(
+                Priority.STORY, lambda: self.llm.ainvoke(prompt),
+                estimated_tokens=estimate_tokens(prompt, max_output=100)
+            ))
             data = self.parser.parse(response.content)
             return data["name"], data["culture_label"]
         except Exception as e:
             logger.error(f"Identity Generation Failed: {e}")
-            return "Protagonist", theme_input.title()
+            return FALLBACK_NAME, theme_input.title()
+
+    def _generate_identity_llm(self, theme_input):
+        """Sync wrapper around _agenerate_identity_llm."""
+        return run_sync(self._agenerate_identity_llm(theme_input))
 
     def initialize_character(self, name, culture_input):
+        """Sync wrapper around ainitialize_character."""
+        return run_sync(self.ainitialize_character(name, culture_input))
+
+    async def ainitialize_character(self, name, culture_input):
         # If name is generic or missing, use LLM to generate identity
         if not name or "Protagonist" in name:
-            gen_name, gen_culture = self._generate_identity_llm(culture_input)
+            gen_name, gen_culture = await self._agenerate_identity_llm(culture_input)
             final_name = gen_name
             final_culture = gen_culture
         else:
@@ -2,15 +2,22 @@ from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
 from config import MODEL_FAST
 from logger_config import get_logger
+from single_flight import llm_single_flight
+from llm_scheduler import llm_scheduler, Priority, estimate_tokens
+from async_utils import run_sync
 
 logger = get_logger()
 
 class CinematographyEngine:
     def __init__(self):
         # We use a specialized instance for visual instruction
-        self.llm = ChatGroq(model=MODEL_FAST, temperature=0.7)
+        self.llm = ChatGroq(model=MODEL_FAST, temperature=0.7, max_retries=0)
 
     def enhance_prompt(self, story_segment, emotion):
+        """Sync wrapper around aenhance_prompt."""
+        return run_sync(self.aenhance_prompt(story_segment, emotion))
+
+    async def aenhance_prompt(self, story_segment, emotion):
         """
         Generates a visually rich, cinematic description using an LLM.
         Avoids hardcoded mappings.
@@ -32,7 +39,12 @@ class CinematographyEngine:
         chain = prompt_template | self.llm
         
         try:
-            result = chain.invoke({"story": story_segment, "emotion": emotion})
+            key = ("cinematography", MODEL_FAST, story_segment, emotion)
+            inputs = {"story": story_segment, "emotion": emotion}
+            result = await llm_single_flight.ado(key, lambda: llm_scheduler.arun(
+                Priority.CINEMATOGRAPHY, lambda: chain.ainvoke(inputs),
+                estimated_tokens=estimate_tokens(inputs, max_output=80)
+            ))
             return result.content.strip()
         except Exception as e:
             logger.error(f"Cinematography Engine Error: {e}")
@@ -6,11 +6,60 @@ MODEL_FAST = "llama-3.3-70b-versatile" # 8b model caused panic/instability
 
 # Limits
 MAX_HISTORY_TURNS = 10
+REDUCED_HISTORY_TURNS = 4  # used when QoS sheds load
+STRUCTURED_OUTPUT_MAX_REASKS = 1  # re-asks after local JSON repair fails
 MORAL_SCORE_MIN = -10
 MORAL_SCORE_MAX = 10
 
 # Defaults
 DEFAULT_LANGUAGE = "English"
+UI_CONCURRENCY_LIMIT = int(os.getenv("UI_CONCURRENCY_LIMIT", "256"))  # concurrent turns per Gradio event
 
-# Defaults
-DEFAULT_LANGUAGE = "English"
+# Request Coalescing
+SINGLE_FLIGHT_TIMEOUT = 90  # seconds a waiter will block on an in-flight LLM call
+
+
+# LLM Scheduling (provider limits shared by all engines)
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "30"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "12000"))
+LLM_DEFAULT_DEADLINE = 60  # seconds a request may wait in the queue
+LLM_RATE_LIMIT_RETRIES = 2
+LLM_DEFAULT_RETRY_AFTER = 5.0  # used when a 429 carries no retry-after header
+LLM_TRANSIENT_RETRIES = 2  # connection errors, timeouts and 5xx (the SDK's own retries are off)
+LLM_TRANSIENT_BACKOFF = 0.5  # seconds, doubled per attempt
+LLM_ASYNC_POLL_INTERVAL = 0.05  # seconds between dispatch checks for async waiters
+
+# Quality of Service (index i = threshold to enter level i+1: no images, no audio, reduced)
+QOS_QUEUE_DEPTH_THRESHOLDS = (4, 8, 16)
+QOS_LATENCY_THRESHOLDS = (12.0, 20.0, 30.0)  # p90 turn latency, seconds
+QOS_RECOVERY_RATIO = 0.6  # step down only once signals fall below 60% of the current level's threshold
+QOS_MIN_DWELL = 15.0  # seconds between level changes
+QOS_LATENCY_WINDOW = 20  # recent turns considered
+QOS_LATENCY_MAX_AGE = 120.0  # seconds before a latency sample is ignored
+
+# Scene Change Detection (similarity 0..1 between consecutive turns)
+SCENE_REUSE_THRESHOLD = 0.65  # reuse the previous illustration
+SCENE_VARIANT_THRESHOLD = 0.45  # render a cheaper draft variant
+SCENE_VARIANT_COST = 0.25  # relative cost of a draft vs a full render
+SCENE_DRAFT_PARAMS = {"num_inference_steps": 2, "width": 512, "height": 512}
+
+# Media Store (set MEDIA_ROOT to a tmpfs such as /dev/shm/storyteller for RAM-backed media)
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", os.path.abspath("media"))
+MEDIA_MAX_BYTES = int(os.getenv("MEDIA_MAX_MB", "2048")) * 1024 * 1024
+MEDIA_MAX_AGE = int(os.getenv("MEDIA_MAX_AGE_HOURS", "6")) * 3600
+MEDIA_SWEEP_INTERVAL = 300  # seconds between background eviction sweeps
+MEDIA_DIR_GRACE = 600  # seconds an empty session directory survives sweeps after last use
+MEDIA_IN_MEMORY = os.getenv("MEDIA_IN_MEMORY", "false").lower() == "true"  # hand images to Gradio without writing them here
+
+# Image Post-processing
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "webp")  # "webp" or "jpeg" (progressive)
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+THUMBNAIL_SIZE = 64  # px, longest edge of the placeholder
+IMAGE_WORKERS = 2
+IMAGE_ENCODE_TIMEOUT = 30  # seconds
+
+# Warm Cache (written by batch_generate.py, read by the app when present)
+STORY_CACHE_PATH = os.getenv("STORY_CACHE_PATH", "story_cache.db")
+
+# Operational Stats (queue depth, waits, coalescing, encode savings; 0 disables)
+STATS_LOG_INTERVAL = int(os.getenv("STATS_LOG_INTERVAL", "60"))  # seconds between stats log lines
@@ -2,15 +2,26 @@ from config import MODEL_FAST
 from langchain_groq import ChatGroq
 from langchain_core.messages import SystemMessage, HumanMessage
 from logger_config import get_logger
+from single_flight import llm_single_flight
+from llm_scheduler import llm_scheduler, Priority, estimate_tokens
+from async_utils import run_sync
 
 logger = get_logger()
 
+# Returned when the knowledge block can't be generated
+FALLBACK_CONTEXT = "General cultural knowledge applies."
+
 class CultureEngine:
     def __init__(self):
         # Use Fast model for quick context retrieval/generation
-        self.llm = ChatGroq(model=MODEL_FAST)
+        # Retries are owned by the shared scheduler so retry-after is honoured globally
+        self.llm = ChatGroq(model=MODEL_FAST, max_retries=0)
 
     def get_context_string(self, theme):
+        """Sync wrapper around aget_context_string."""
+        return run_sync(self.aget_context_string(theme))
+
+    async def aget_context_string(self, theme):
         """
         Dynamically generates a 'Knowledge Block' about the theme using the LLM.
         """
@@ -40,11 +51,16 @@ class CultureEngine:
                 SystemMessage(content=system_prompt),
                 HumanMessage(content=user_prompt)
             ]
-            response = self.llm.invoke(messages)
+            # Sessions starting the same theme at once share one upstream call
+            key = ("culture", MODEL_FAST, system_prompt, user_prompt)
+            response = await llm_single_flight.ado(key, lambda: llm_scheduler.arun(
+                Priority.STORY, lambda: self.llm.ainvoke(messages),
+                estimated_tokens=estimate_tokens(messages, max_output=600)
+            ))
             return response.content
         except Exception as e:
             logger.error(f"Culture Generation Failed: {e}")
-            return "General cultural knowledge applies."
+            return FALLBACK_CONTEXT
 
 if __name__ == "__main__":
     ce = CultureEngine()
@@ -0,0 +1,155 @@
+import asyncio
+import io
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from config import IMAGE_FORMAT, IMAGE_QUALITY, THUMBNAIL_SIZE, IMAGE_WORKERS, IMAGE_ENCODE_TIMEOUT
+from logger_config import get_logger
+
+logger = get_logger()
+
+ProcessedImage = namedtuple("ProcessedImage", ["data", "ext", "thumbnail", "original_bytes", "encode_ms"])
+
+_EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+
+def _transcode(data, fmt, quality):
+    """
+    Worker (runs on a pool thread): re-encodes raw image bytes without metadata.
+    Returns (data, encode_ms).
+    """
+    from PIL import Image
+
+    start = time.perf_counter()
+    image = Image.open(io.BytesIO(data)).convert("RGB")
+    # Drop EXIF/ICC/text chunks carried over from the source
+    image.info = {}
+
+    out = io.BytesIO()
+    if fmt == "jpeg":
+        image.save(out, "JPEG", quality=quality, progressive=True, optimize=True)
+    else:
+        image.save(out, "WEBP", quality=quality, method=4)
+    return out.getvalue(), (time.perf_counter() - start) * 1000
+
+def _thumbnail(data, thumb_size):
+    """Worker: tiny blurred JPEG placeholder; much cheaper than the full transcode."""
+    from PIL import Image, ImageFilter
+
+    image = Image.open(io.BytesIO(data))
+    # draft() lets the JPEG decoder downscale while decoding
+    image.draft("RGB", (thumb_size * 2, thumb_size * 2))
+    thumb = image.convert("RGB")
+    thumb.thumbnail((thumb_size, thumb_size))
+    thumb = thumb.filter(ImageFilter.GaussianBlur(1))
+    out = io.BytesIO()
+    thumb.save(out, "JPEG", quality=40)
+    return out.getvalue()
+
+class ImagePipeline:
+    """
+    Post-processes generated scene images in a worker pool: transcodes to WebP
+    or progressive JPEG, strips metadata and emits a placeholder thumbnail the UI
+    can show while the full image is still encoding. Falls back to the original
+    bytes if encoding fails.
+    """
+    def __init__(self, fmt=IMAGE_FORMAT, quality=IMAGE_QUALITY, thumb_size=THUMBNAIL_SIZE, workers=IMAGE_WORKERS):
+        self.fmt = fmt if fmt in _EXTENSIONS else "webp"
+        self.quality = quality
+        self.thumb_size = thumb_size
+        self.workers = workers
+        self._pool = None
+        self._lock = threading.Lock()
+        self.stats = {"images": 0, "bytes_in": 0, "bytes_out": 0, "encode_ms": 0.0, "failures": 0}
+
+    def _get_pool(self):
+        # Threads, not processes: Pillow releases the GIL while decoding, resampling and
+        # encoding, so workers run in parallel without spawned children re-importing app.py
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="image")
+            return self._pool
+
+    def _submit(self, data):
+        """Queues the placeholder ahead of the full transcode; returns (thumbnail_future, encode_future)."""
+        pool = self._get_pool()
+        return pool.submit(_thumbnail, data, self.thumb_size), pool.submit(_transcode, data, self.fmt, self.quality)
+
+    def _fallback(self, data, source_ext, error, thumbnail=None):
+        logger.warning(f"ImagePipeline: transcoding failed, serving original ({error})")
+        with self._lock:
+            self.stats["failures"] += 1
+        return ProcessedImage(data, source_ext, thumbnail, len(data), 0.0)
+
+    def process(self, data, source_ext="png"):
+        """Returns a ProcessedImage for raw image bytes."""
+        thumbnail = None
+        try:
+            thumb_future, encode_future = self._submit(data)
+            try:
+                thumbnail = thumb_future.result(timeout=IMAGE_ENCODE_TIMEOUT)
+            except Exception as e:
+                logger.warning(f"ImagePipeline: placeholder failed ({e})")
+            encoded, encode_ms = encode_future.result(timeout=IMAGE_ENCODE_TIMEOUT)
+        except Exception as e:
+            return self._fallback(data, source_ext, e, thumbnail)
+        return self._record(data, ProcessedImage(encoded, _EXTENSIONS[self.fmt], thumbnail, len(data), encode_ms))
+
+    async def astream(self, data, source_ext="png"):
+        """
+        Async generator: yields ("thumbnail", bytes) as soon as the placeholder is
+        ready (skipped if it fails), then ("image", ProcessedImage) once the full
+        transcode finishes. The event loop stays free while the pool encodes.
+        """
+        thumbnail = None
+        try:
+            thumb_future, encode_future = self._submit(data)
+        except Exception as e:
+            yield "image", self._fallback(data, source_ext, e)
+            return
+        try:
+            thumbnail = await asyncio.wait_for(asyncio.wrap_future(thumb_future), IMAGE_ENCODE_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"ImagePipeline: placeholder failed ({e})")
+        if thumbnail:
+            yield "thumbnail", thumbnail
+        try:
+            encoded, encode_ms = await asyncio.wait_for(asyncio.wrap_future(encode_future), IMAGE_ENCODE_TIMEOUT)
+        except Exception as e:
+            yield "image", self._fallback(data, source_ext, e, thumbnail)
+            return
+        yield "image", self._record(data, ProcessedImage(encoded, _EXTENSIONS[self.fmt], thumbnail, len(data), encode_ms))
+
+    async def aprocess(self, data, source_ext="png"):
+        """Async counterpart of process()."""
+        async for kind, value in self.astream(data, source_ext):
+            if kind == "image":
+                return value
+
+    def _record(self, data, processed):
+        with self._lock:
+            self.stats["images"] += 1
+            self.stats["bytes_in"] += len(data)
+            self.stats["bytes_out"] += len(processed.data)
+            self.stats["encode_ms"] += processed.encode_ms
+        saved = 1 - len(processed.data) / max(1, len(data))
+        logger.info(
+            f"ImagePipeline: {len(data) / 1024:.0f} KB -> {len(processed.data) / 1024:.0f} KB {self.fmt} "
+            f"({saved:.0%} saved) in {processed.encode_ms:.0f} ms"
+        )
+        return processed
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["bytes_saved"] = stats["bytes_in"] - stats["bytes_out"]
+        stats["avg_encode_ms"] = round(stats["encode_ms"] / stats["images"], 1) if stats["images"] else 0.0
+        return stats
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+image_pipeline = ImagePipeline()
@@ -0,0 +1,301 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from enum import IntEnum
+from config import (
+    LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE, LLM_DEFAULT_DEADLINE,
+    LLM_RATE_LIMIT_RETRIES, LLM_DEFAULT_RETRY_AFTER, LLM_ASYNC_POLL_INTERVAL,
+    LLM_TRANSIENT_RETRIES, LLM_TRANSIENT_BACKOFF
+)
+from logger_config import get_logger
+
+logger = get_logger()
+
+class Priority(IntEnum):
+    """Lower value is served first."""
+    STORY = 0           # story text, plus the culture/identity calls that gate it
+    MORAL = 1
+    CINEMATOGRAPHY = 2
+    REFLECTION = 3
+
+class SchedulerDeadlineExceeded(Exception):
+    """Raised when a request could not be dispatched before its deadline."""
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `per_minute / 60` per second."""
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount):
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount):
+        # May go negative when actual usage exceeds the estimate; refill pays it back
+        self.tokens -= amount
+
+def estimate_tokens(payload, max_output=300):
+    """Rough token estimate (~4 chars/token) for a prompt string, message list or input dict."""
+    if isinstance(payload, str):
+        chars = len(payload)
+    elif isinstance(payload, dict):
+        chars = sum(len(str(v)) for v in payload.values())
+    else:
+        chars = sum(len(str(getattr(m, "content", m))) for m in payload)
+    return chars // 4 + max_output
+
+def _retry_after(error):
+    """Extracts a retry-after delay (seconds) from a provider rate-limit error, if any."""
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") if hasattr(headers, "get") else None
+    if value is not None:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return LLM_DEFAULT_RETRY_AFTER
+    if status == 429:
+        return LLM_DEFAULT_RETRY_AFTER
+    return None
+
+# Provider SDK errors worth retrying, matched by name so the scheduler needs no SDK import
+# (groq/openai: APITimeoutError subclasses APIConnectionError; 5xx map to InternalServerError)
+_TRANSIENT_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "InternalServerError"}
+
+def _is_transient(error):
+    """True for connection failures, timeouts and provider 5xx responses."""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    if any(cls.__name__ in _TRANSIENT_ERROR_NAMES for cls in type(error).__mro__):
+        return True
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return isinstance(status, int) and status >= 500
+
+class _Ticket:
+    __slots__ = ("priority", "seq", "tokens", "deadline", "enqueued_at")
+
+    def __init__(self, priority, seq, tokens, deadline, enqueued_at):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.deadline = deadline
+        self.enqueued_at = enqueued_at
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+class LLMScheduler:
+    """
+    Central dispatcher for all LLM calls in the process.
+    Requests queue by priority (FIFO within a class) and are released only when
+    both the requests-per-minute and tokens-per-minute buckets allow it.
+    A provider `retry-after` pauses dispatch for everyone and re-queues the request.
+    """
+    def __init__(self, requests_per_minute=LLM_REQUESTS_PER_MINUTE, tokens_per_minute=LLM_TOKENS_PER_MINUTE):
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._waits = deque(maxlen=500)
+        self.stats = {
+            "dispatched": 0, "expired": 0, "cancelled": 0, "rate_limited": 0, "transient_retries": 0,
+            "max_queue_depth": 0, "by_priority": {p.name: 0 for p in Priority}
+        }
+
+    # ---------------- QUEUE MANAGEMENT ----------------
+    def _enqueue(self, priority, tokens, deadline):
+        now = time.monotonic()
+        ticket = _Ticket(int(priority), next(self._seq), tokens, deadline, now)
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], len(self._queue))
+        return ticket
+
+    def _drop(self, ticket, reason="expired"):
+        """Removes an abandoned ticket if it is still queued (caller holds the lock)."""
+        try:
+            self._queue.remove(ticket)
+        except ValueError:
+            return
+        heapq.heapify(self._queue)
+        self.stats[reason] += 1
+        self._cond.notify_all()
+
+    def _try_grant(self, ticket, now):
+        """
+        Grants the ticket if it is at the head of the queue and limits allow.
+        Caller holds the lock. Returns 0 when granted, otherwise seconds to wait.
+        """
+        if now >= ticket.deadline:
+            self._drop(ticket)
+            raise SchedulerDeadlineExceeded(
+                f"LLM request (priority {Priority(ticket.priority).name}) not dispatched within its deadline"
+            )
+        if self._queue[0] is not ticket:
+            # Woken by notify_all when the head moves; the timeout only bounds the deadline check
+            return ticket.deadline - now
+        if now < self._paused_until:
+            return self._paused_until - now
+
+        self.request_bucket.refill(now)
+        self.token_bucket.refill(now)
+        wait = max(self.request_bucket.time_until(1), self.token_bucket.time_until(ticket.tokens))
+        if wait > 0:
+            return wait
+
+        self.request_bucket.consume(1)
+        self.token_bucket.consume(ticket.tokens)
+        heapq.heappop(self._queue)
+        self._waits.append(now - ticket.enqueued_at)
+        self.stats["dispatched"] += 1
+        self.stats["by_priority"][Priority(ticket.priority).name] += 1
+        self._cond.notify_all()
+        return 0
+
+    def _acquire(self, ticket):
+        with self._cond:
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._try_grant(ticket, now)
+                    if wait <= 0:
+                        return
+                    self._cond.wait(timeout=min(wait, ticket.deadline - now))
+            except BaseException:
+                self._drop(ticket, "cancelled")
+                raise
+
+    async def _aacquire(self, ticket):
+        # Async waiters can't block on the condition, so they poll at a short interval
+        try:
+            while True:
+                with self._cond:
+                    now = time.monotonic()
+                    wait = self._try_grant(ticket, now)
+                if wait <= 0:
+                    return
+                await asyncio.sleep(min(wait, LLM_ASYNC_POLL_INTERVAL))
+        except BaseException:
+            # A cancelled waiter (e.g. the client disconnected) must not leave an orphan at the head
+            with self._cond:
+                self._drop(ticket, "cancelled")
+            raise
+
+    def _pause(self, seconds):
+        with self._cond:
+            self.stats["rate_limited"] += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+        logger.warning(f"LLMScheduler: provider rate limit hit, pausing dispatch for {seconds:.1f}s")
+
+    def _reconcile(self, result, estimated):
+        """Charges the token bucket for usage beyond the estimate when the provider reports it."""
+        usage = getattr(result, "usage_metadata", None) or {}
+        actual = usage.get("total_tokens") if isinstance(usage, dict) else None
+        if actual and actual > estimated:
+            with self._cond:
+                self.token_bucket.consume(actual - estimated)
+
+    # ---------------- PUBLIC API ----------------
+    def _log_wait(self, ticket):
+        waited = time.monotonic() - ticket.enqueued_at
+        if waited > 2.0:
+            logger.info(f"LLMScheduler: {Priority(ticket.priority).name} request waited {waited:.1f}s (queue depth {len(self._queue)})")
+
+    def _retry_delay(self, error, attempts, expires_at):
+        """
+        Decides whether a failed call is retried; `attempts` counts retries so far by kind.
+        A rate limit pauses dispatch for everyone and returns 0 (the queue does the waiting);
+        a transient error returns this caller's backoff. Re-raises anything else.
+        """
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            if attempts["rate_limit"] == LLM_RATE_LIMIT_RETRIES:
+                raise error
+            if time.monotonic() + retry_after >= expires_at:
+                raise SchedulerDeadlineExceeded(f"Rate limited; retry-after {retry_after:.1f}s exceeds deadline") from error
+            attempts["rate_limit"] += 1
+            self._pause(retry_after)
+            return 0.0
+
+        if not _is_transient(error) or attempts["transient"] == LLM_TRANSIENT_RETRIES:
+            raise error
+        delay = LLM_TRANSIENT_BACKOFF * 2 ** attempts["transient"]
+        if time.monotonic() + delay >= expires_at:
+            raise error
+        attempts["transient"] += 1
+        with self._cond:
+            self.stats["transient_retries"] += 1
+        logger.warning(f"LLMScheduler: transient provider error ({type(error).__name__}), retrying in {delay:.1f}s")
+        return delay
+
+    def run(self, priority, fn, estimated_tokens=500, deadline=LLM_DEFAULT_DEADLINE):
+        """
+        Blocks until the request may be dispatched, then returns fn().
+        `deadline` is seconds from now; rate-limited calls (after the provider's
+        retry-after) and transient failures (after a short backoff) are retried
+        within the same deadline.
+        """
+        expires_at = time.monotonic() + deadline
+        attempts = {"rate_limit": 0, "transient": 0}
+        while True:
+            ticket = self._enqueue(priority, estimated_tokens, expires_at)
+            self._acquire(ticket)
+            self._log_wait(ticket)
+            try:
+                result = fn()
+            except Exception as e:
+                delay = self._retry_delay(e, attempts, expires_at)
+                if delay:
+                    time.sleep(delay)
+                continue
+            self._reconcile(result, estimated_tokens)
+            return result
+
+    async def arun(self, priority, coro_fn, estimated_tokens=500, deadline=LLM_DEFAULT_DEADLINE):
+        """Async counterpart of run(): awaits dispatch without holding a thread, then awaits coro_fn()."""
+        expires_at = time.monotonic() + deadline
+        attempts = {"rate_limit": 0, "transient": 0}
+        while True:
+            ticket = self._enqueue(priority, estimated_tokens, expires_at)
+            await self._aacquire(ticket)
+            self._log_wait(ticket)
+            try:
+                result = await coro_fn()
+            except Exception as e:
+                delay = self._retry_delay(e, attempts, expires_at)
+                if delay:
+                    await asyncio.sleep(delay)
+                continue
+            self._reconcile(result, estimated_tokens)
+            return result
+
+    def get_stats(self):
+        """Queue depth and wait-time figures for capacity sizing."""
+        with self._cond:
+            waits = sorted(self._waits)
+            stats = dict(self.stats, by_priority=dict(self.stats["by_priority"]))
+            stats["queue_depth"] = len(self._queue)
+            stats["paused_for"] = max(0.0, self._paused_until - time.monotonic())
+        stats["wait_avg"] = round(sum(waits) / len(waits), 3) if waits else 0.0
+        stats["wait_p95"] = round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3) if waits else 0.0
+        stats["wait_max"] = round(waits[-1], 3) if waits else 0.0
+        return stats
+
+# Single process-wide scheduler shared by every engine
+llm_scheduler = LLMScheduler()
@@ -1,15 +1,120 @@
+import atexit
+import contextvars
+import json
 import logging
 import os
+import queue
 import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+# Session id of the turn being handled; set per request and attached to every record
+session_id_var = contextvars.ContextVar("session_id", default=None)
+
+_listener = None
+
+def bind_session(session_id):
+    """Tags all log records emitted from the current task/thread with this session id."""
+    session_id_var.set(session_id)
+
+class SessionContextFilter(logging.Filter):
+    def filter(self, record):
+        record.session_id = session_id_var.get()
+        return True
+
+class RepeatedErrorFilter(logging.Filter):
+    """
+    Rate-limits WARNING+ records per call site: the first `burst` in each `window`
+    pass, later ones are dropped and counted, and the count is attached to the
+    next record that gets through so bursts stay visible without flooding.
+    """
+    def __init__(self, window=60.0, burst=5):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._sites = {}
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True
+        key = (record.name, record.levelno, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            started, count, suppressed = self._sites.get(key, (now, 0, 0))
+            if now - started > self.window:
+                started, count = now, 0
+            if count < self.burst:
+                self._sites[key] = (started, count + 1, 0)
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            self._sites[key] = (started, count, suppressed + 1)
+            return False
+
+class BoundedQueueHandler(QueueHandler):
+    """Never blocks the caller: when the queue is full the record is dropped and counted."""
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def enqueue(self, record):
+        # Report drops since the last successful enqueue on the next record out
+        with self._lock:
+            pending = self.dropped
+        record.dropped = pending
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return
+        if pending:
+            with self._lock:
+                self.dropped -= pending
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in ("session_id", "suppressed", "dropped", "stats"):
+            value = getattr(record, field, None)
+            if value:
+                entry[field] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        text = f"[{record.levelname}] {record.getMessage()}"
+        if getattr(record, "session_id", None):
+            text = f"[{record.levelname}] [{record.session_id[:8]}] {record.getMessage()}"
+        if getattr(record, "suppressed", 0):
+            text += f" (+{record.suppressed} similar suppressed)"
+        if getattr(record, "dropped", 0):
+            text += f" ({record.dropped} log records dropped under load)"
+        if getattr(record, "stats", None):
+            text += " " + json.dumps(record.stats, default=str)
+        return text
 
 def setup_logger():
     """
     Configures a professional, clean logger for the application.
+    Records are handed to a bounded queue on the calling thread and written by a
+    background listener, so logging never blocks a request. Output is JSON lines
+    (LOG_FORMAT=json, default) or plain text (LOG_FORMAT=text).
     Suppresses noisy libraries and handles known benign errors.
     """
+    global _listener
+
     # 1. Environment & Library Suppression
     os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'  # FATAL only for TensorFlow
-    
+
     # Check for DEBUG mode
     debug_mode = os.getenv("DEBUG", "false").lower() == "true"
     log_level = logging.DEBUG if debug_mode else logging.INFO
@@ -17,21 +122,32 @@ def setup_logger():
     # 2. Configure Main Logger
     logger = logging.getLogger("storyteller")
     logger.setLevel(log_level)
-    
-    # Clean Format
-    formatter = logging.Formatter('[%(levelname)s] %(message)s')
-    
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setFormatter(formatter)
-    
+
     # Avoid duplicate handlers
     if not logger.handlers:
-        logger.addHandler(handler)
+        log_format = os.getenv("LOG_FORMAT", "json").lower()
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(TextFormatter() if log_format == "text" else JsonLinesFormatter())
+
+        log_queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+        queue_handler = BoundedQueueHandler(log_queue)
+        queue_handler.addFilter(SessionContextFilter())
+        queue_handler.addFilter(RepeatedErrorFilter(
+            window=float(os.getenv("LOG_RATE_WINDOW", "60")),
+            burst=int(os.getenv("LOG_RATE_BURST", "5"))
+        ))
+        logger.addHandler(queue_handler)
+        # Records only reach our handler; don't duplicate through the root logger
+        logger.propagate = False
+
+        _listener = QueueListener(log_queue, stream_handler)
+        _listener.start()
+        atexit.register(_listener.stop)
 
     # 3. Suppress Noisy Libraries
     # These libraries are very chatty; silence them unless critical
     noisy_libs = [
-        "mediapipe", "tensorflow", "absl", "h5py", 
+        "mediapipe", "tensorflow", "absl", "h5py",
         "numexpr", "urllib3", "httpx", "httpcore"
     ]
     for lib in noisy_libs:
@@ -40,7 +156,7 @@ def setup_logger():
     # 4. Handle Asyncio Noise (WinError 10054)
     # This error often spams on Windows/Gradio shutdown or reload
     asyncio_logger = logging.getLogger("asyncio")
-    asyncio_logger.setLevel(logging.CRITICAL) 
+    asyncio_logger.setLevel(logging.CRITICAL)
 
     return logger
 
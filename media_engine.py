@@ -1,14 +1,23 @@
+import asyncio
 import os
-import time
 import traceback
-import requests
-import base64
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+import httpx
 import pyttsx3
 from cinematography_engine import CinematographyEngine
+from config import SCENE_DRAFT_PARAMS
+from media_store import media_store
+from image_pipeline import image_pipeline
+from async_utils import run_sync
 from logger_config import get_logger
 
 logger = get_logger()
 
+# pyttsx3.init() hands back one cached engine per driver that cannot run two loops at once,
+# so every synthesis goes through this single thread
+_tts_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts")
+
 class MediaEngine:
     def __init__(self):
         # Hugging Face token check
@@ -16,7 +25,10 @@ class MediaEngine:
         if not self.hf_token:
             logger.warning("HUGGINGFACE_API_TOKEN not found. Image generation disabled.")
 
-        # pyttsx3 is initialized per-call to avoid threading issues on Windows/Gradio
+        # pyttsx3 runs on the dedicated TTS thread (see _tts_executor)
+
+        # One pooled HTTP client per event loop (connections can't cross loops), reused across turns
+        self._http_clients = weakref.WeakKeyDictionary()
 
         # Initialize Cinematography Engine
         try:
@@ -26,90 +38,151 @@ class MediaEngine:
             self.cine_engine = None
 
     # ---------------- IMAGE GENERATION ----------------
-    def generate_scene(self, story_text, emotion="neutral", character_desc="", visual_keywords_bypass=None):
+    def generate_scene(self, story_text, emotion="neutral", character_desc="", visual_keywords_bypass=None, draft=False, session_id=None):
+        """Sync wrapper around agenerate_scene."""
+        return run_sync(self.agenerate_scene(
+            story_text, emotion, character_desc, visual_keywords_bypass=visual_keywords_bypass,
+            draft=draft, session_id=session_id
+        ))
+
+    async def agenerate_scene(self, story_text, emotion="neutral", character_desc="", visual_keywords_bypass=None, draft=False, session_id=None):
+        """
+        Renders a scene illustration into the session's media directory (or memory).
+        `draft` requests a cheaper, lower-resolution variant for scenes that changed
+        only slightly since the previous turn.
+        Returns (image, media_type).
+        """
+        image = None
+        async for kind, value in self.astream_scene(
+            story_text, emotion, character_desc, visual_keywords_bypass, draft, session_id, preview=False
+        ):
+            if kind == "image":
+                image = value
+        return image, "image"
+
+    async def astream_scene(self, story_text, emotion="neutral", character_desc="", visual_keywords_bypass=None, draft=False, session_id=None, preview=True):
+        """
+        Async generator form of agenerate_scene for the UI: yields ("preview", placeholder)
+        while the full image is still being transcoded, then ("image", image or None).
+        """
         if not self.hf_token:
-            return None, "image"
+            yield "image", None
+            return
 
+        image = None
         try:
-            # 1. Get Cinematography Keywords
-            if visual_keywords_bypass:
-                keywords = visual_keywords_bypass
-            elif self.cine_engine:
-                keywords = self.cine_engine.enhance_prompt(story_text[:500], emotion)
-            else:
-                keywords = f"cinematic, {emotion} atmosphere"
-
-            # 2. Construct Prompt with Character Consistency
-            prompt = f"""
-            masterpiece, ultra-detailed cinematic illustration, storybook fantasy art,
-            authentic cultural aesthetics, rich textures, 8k resolution,
-            {keywords},
-            
-            SCENE:
-            {story_text[:400]}
-            
-            CHARACTER FOCUS:
-            {character_desc}
-            
-            STYLE:
-            digital painting, concept art, unreal engine quality, artstation trending
-            
-            NEGATIVE:
-            blurry, low resolution, distorted face, extra limbs, bad anatomy, watermark, text
-            """
-
-            API_URL = (
-                "https://router.huggingface.co/hf-inference/models/"
-                "black-forest-labs/FLUX.1-schnell"
-            )
-            headers = {
-                "Authorization": f"Bearer {self.hf_token}",
-                "Content-Type": "application/json"
-            }
-
-            response = requests.post(
-                API_URL,
-                headers=headers,
-                json={"inputs": prompt},
-                timeout=60
-            )
-
-            if response.status_code != 200:
-                raise Exception(f"HF Error {response.status_code}: {response.text}")
-
-            filename = f"scene_{int(time.time())}.png"
-            output_path = os.path.abspath(filename)
-
-            with open(output_path, "wb") as f:
-                f.write(response.content)
-
-            logger.info(f"Image saved → {output_path}")
-            return output_path, "image"
-
+            data = await self._afetch_scene(story_text, emotion, character_desc, visual_keywords_bypass, draft)
+            async for kind, value in image_pipeline.astream(data):
+                if kind == "thumbnail":
+                    if preview:
+                        yield "preview", await asyncio.to_thread(media_store.image_value, session_id, value, "jpg", "thumb")
+                else:
+                    image, _ = await self.astore_scene(session_id, value.data, value.ext)
         except Exception as e:
             logger.error(f"Image generation failed: {e}")
             logger.debug(traceback.format_exc())
+        yield "image", image
+
+    async def astore_scene(self, session_id, data, ext):
+        """Hands encoded image bytes to the media store for display. Returns (image, media_type)."""
+        image_value = await asyncio.to_thread(media_store.image_value, session_id, data, ext)
+        if isinstance(image_value, str):
+            logger.info(f"Image saved → {image_value}")
+        return image_value, "image"
+
+    async def arender_scene(self, story_text, emotion="neutral", character_desc="", visual_keywords_bypass=None, draft=False):
+        """Calls the image model and returns a transcoded ProcessedImage. Raises on failure."""
+        data = await self._afetch_scene(story_text, emotion, character_desc, visual_keywords_bypass, draft)
+        return await image_pipeline.aprocess(data)
+
+    async def _afetch_scene(self, story_text, emotion, character_desc, visual_keywords_bypass, draft):
+        """Calls the image model and returns the raw image bytes. Raises on failure."""
+        if not self.hf_token:
+            raise RuntimeError("Image generation disabled (no HUGGINGFACE_API_TOKEN)")
+
+        # 1. Get Cinematography Keywords
+        if visual_keywords_bypass:
+            keywords = visual_keywords_bypass
+        elif self.cine_engine:
+            keywords = await self.cine_engine.aenhance_prompt(story_text[:500], emotion)
+        else:
+            keywords = f"cinematic, {emotion} atmosphere"
+
+        # 2. Construct Prompt with Character Consistency
+        prompt = f"""
+        masterpiece, ultra-detailed cinematic illustration, storybook fantasy art,
+        authentic cultural aesthetics, rich textures, 8k resolution,
+        {keywords},
+        
+        SCENE:
+        {story_text[:400]}
+        
+        CHARACTER FOCUS:
+        {character_desc}
+        
+        STYLE:
+        digital painting, concept art, unreal engine quality, artstation trending
+        
+        NEGATIVE:
+        blurry, low resolution, distorted face, extra limbs, bad anatomy, watermark, text
+        """
+
+        API_URL = (
+            "https://router.huggingface.co/hf-inference/models/"
+            "black-forest-labs/FLUX.1-schnell"
+        )
+        headers = {
+            "Authorization": f"Bearer {self.hf_token}",
+            "Content-Type": "application/json"
+        }
+
+        payload = {"inputs": prompt}
+        if draft:
+            payload["parameters"] = SCENE_DRAFT_PARAMS
+
+        response = await self._http_client().post(API_URL, headers=headers, json=payload)
+
+        if response.status_code != 200:
+            raise Exception(f"HF Error {response.status_code}: {response.text}")
+        return response.content
+
+    def _http_client(self):
+        """Long-lived AsyncClient for the running loop, so image requests reuse TLS connections."""
+        loop = asyncio.get_running_loop()
+        client = self._http_clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(timeout=60)
+            self._http_clients[loop] = client
+        return client
+
+    async def aclose(self):
+        """Closes the HTTP client belonging to the running loop."""
+        client = self._http_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
 
-            with open("debug_error.log", "w") as f:
-                f.write(str(e))
+    # ---------------- AUDIO GENERATION ----------------
+    async def agenerate_audio(self, text, voice_id=None, session_id=None):
+        """pyttsx3 is blocking, so synthesis is queued on the single TTS thread."""
+        return await asyncio.wrap_future(_tts_executor.submit(self._synthesize, text, voice_id, session_id))
 
-            return None, "image"
+    def generate_audio(self, text, voice_id=None, session_id=None):
+        """Blocking counterpart of agenerate_audio; also serialized on the TTS thread."""
+        return _tts_executor.submit(self._synthesize, text, voice_id, session_id).result()
 
-    # ---------------- AUDIO GENERATION ----------------
-    def generate_audio(self, text, voice_id=None):
+    def _synthesize(self, text, voice_id=None, session_id=None):
         try:
-            # Re-initialize pyttsx3 per call for thread safety in Gradio
             engine = pyttsx3.init()
             # Optional: Set properties
             engine.setProperty('rate', 150)
             engine.setProperty('volume', 1.0)
             
-            output_path = f"audio_{int(time.time())}.mp3"
-            abs_output_path = os.path.abspath(output_path)
+            abs_output_path = media_store.new_path(session_id, "audio", "mp3")
             
-            # Saving to file
-            engine.save_to_file(text, abs_output_path)
-            engine.runAndWait()
+            # Saving to file (renamed into place once fully written)
+            with media_store.atomic_write(abs_output_path) as tmp_path:
+                engine.save_to_file(text, tmp_path)
+                engine.runAndWait()
             
             # Explicit cleanup if possible (pyttsx3 doesn't have a close(), but letting it go out of scope helps)
             del engine
@@ -0,0 +1,195 @@
+import io
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from config import MEDIA_ROOT, MEDIA_MAX_BYTES, MEDIA_MAX_AGE, MEDIA_SWEEP_INTERVAL, MEDIA_DIR_GRACE, MEDIA_IN_MEMORY
+from logger_config import get_logger
+
+logger = get_logger()
+
+SHARED_SESSION = "shared"
+
+class MediaStore:
+    """
+    Owns every generated media file: per-session directories under a configurable
+    root (point MEDIA_ROOT at a tmpfs such as /dev/shm for RAM-backed storage),
+    collision-free names, atomic writes, and background eviction by age and by
+    total size. With `in_memory` enabled, images are handed to Gradio as decoded
+    objects instead of being written here first, and scene reuse is disabled
+    because sessions only keep file references.
+    Gradio copies every image and audio file a handler returns (paths and decoded
+    images alike) into its own cache (GRADIO_TEMP_DIR). Those copies are not
+    counted here; app.py has Gradio expire them with the same age and interval.
+    """
+    def __init__(self, root=MEDIA_ROOT, max_bytes=MEDIA_MAX_BYTES, max_age=MEDIA_MAX_AGE,
+                 sweep_interval=MEDIA_SWEEP_INTERVAL, in_memory=MEDIA_IN_MEMORY):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.sweep_interval = sweep_interval
+        self.in_memory = in_memory
+        os.makedirs(self.root, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._usage = self._scan_usage()
+        self._wake = threading.Event()
+        self._sweeper = None
+        self.stats = {"written": 0, "evicted_files": 0, "evicted_bytes": 0}
+
+    # ---------------- NAMING ----------------
+    def _session_path(self, session_id=None):
+        safe_id = re.sub(r"[^A-Za-z0-9_-]", "", str(session_id or SHARED_SESSION)) or SHARED_SESSION
+        return os.path.join(self.root, "sessions", safe_id)
+
+    def session_dir(self, session_id=None):
+        path = self._session_path(session_id)
+        os.makedirs(path, exist_ok=True)
+        # Marks the directory as in use so the sweeper's empty-dir cleanup leaves it alone
+        os.utime(path)
+        return path
+
+    def new_path(self, session_id, prefix, ext):
+        """Unique path for a new file; names never collide across threads or restarts."""
+        filename = f"{prefix}_{time.time_ns()}_{uuid.uuid4().hex[:8]}.{ext}"
+        return os.path.join(self.session_dir(session_id), filename)
+
+    # ---------------- WRITING ----------------
+    @contextmanager
+    def atomic_write(self, final_path):
+        """
+        Yields a temporary path next to `final_path`; on success it is renamed into
+        place so readers never observe a partially written file.
+        """
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp_", suffix=os.path.splitext(final_path)[1], dir=os.path.dirname(final_path))
+        os.close(fd)
+        try:
+            yield tmp_path
+            os.replace(tmp_path, final_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._account(final_path)
+
+    def write_bytes(self, session_id, prefix, ext, data):
+        """Atomically writes data to a new file and returns its absolute path."""
+        final_path = self.new_path(session_id, prefix, ext)
+        with self.atomic_write(final_path) as tmp_path:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+        return final_path
+
+    def _account(self, path):
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        with self._lock:
+            self._usage += size
+            self.stats["written"] += 1
+            over_quota = self._usage > self.max_bytes
+        self._ensure_sweeper()
+        if over_quota:
+            self._wake.set()
+
+    # ---------------- EVICTION ----------------
+    def _iter_files(self, top=None):
+        for dirpath, _, filenames in os.walk(top or self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _scan_usage(self):
+        return sum(size for _, size, _ in self._iter_files())
+
+    def _remove(self, path, size):
+        try:
+            os.remove(path)
+        except OSError:
+            return 0
+        self.stats["evicted_files"] += 1
+        self.stats["evicted_bytes"] += size
+        return size
+
+    def sweep(self):
+        """Deletes files older than max_age, then the oldest files until under 90% of quota."""
+        now = time.time()
+        files = sorted(self._iter_files(), key=lambda f: f[2])
+        usage = sum(size for _, size, _ in files)
+        freed = 0
+        for path, size, mtime in files:
+            expired = now - mtime > self.max_age
+            over_quota = usage - freed > self.max_bytes * 0.9
+            if not (expired or over_quota):
+                break
+            freed += self._remove(path, size)
+
+        # Drop empty session directories so the tree stays small; recently used ones are
+        # kept so a writer between session_dir() and mkstemp() never loses its directory
+        sessions_root = os.path.join(self.root, "sessions")
+        if os.path.isdir(sessions_root):
+            for name in os.listdir(sessions_root):
+                path = os.path.join(sessions_root, name)
+                try:
+                    if now - os.stat(path).st_mtime > MEDIA_DIR_GRACE and not os.listdir(path):
+                        os.rmdir(path)
+                except OSError:
+                    continue
+
+        with self._lock:
+            self._usage = max(0, usage - freed)
+        if freed:
+            logger.info(f"MediaStore: evicted {freed / 1e6:.1f} MB, {self._usage / 1e6:.1f} MB in use")
+        return freed
+
+    def _sweep_loop(self):
+        while True:
+            self._wake.wait(timeout=self.sweep_interval)
+            self._wake.clear()
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"MediaStore sweep failed: {e}")
+
+    def _ensure_sweeper(self):
+        if self._sweeper is None:
+            with self._lock:
+                if self._sweeper is None:
+                    self._sweeper = threading.Thread(target=self._sweep_loop, name="media-store-sweeper", daemon=True)
+                    self._sweeper.start()
+
+    def drop_session(self, session_id):
+        """Removes every file belonging to a session."""
+        path = self._session_path(session_id)
+        if not os.path.isdir(path):
+            return
+        # Only this session's files are counted, never the whole root
+        size = sum(size for _, size, _ in self._iter_files(path))
+        shutil.rmtree(path, ignore_errors=True)
+        with self._lock:
+            self._usage = max(0, self._usage - size)
+
+    # ---------------- SERVING ----------------
+    def image_value(self, session_id, data, ext="png", prefix="scene"):
+        """
+        Returns something Gradio can display for raw image bytes: a decoded PIL image
+        in in-memory mode, otherwise the path of an atomically written file.
+        Callers must not hold on to the decoded image (e.g. in gr.State).
+        """
+        if self.in_memory:
+            from PIL import Image
+            image = Image.open(io.BytesIO(data))
+            image.load()
+            return image
+        return self.write_bytes(session_id, prefix, ext, data)
+
+media_store = MediaStore()
@@ -4,6 +4,8 @@ from langchain_core.output_parsers import JsonOutputParser
 from pydantic import BaseModel, Field
 from config import MODEL_FAST, MORAL_SCORE_MIN, MORAL_SCORE_MAX
 from logger_config import get_logger
+from llm_scheduler import llm_scheduler, Priority, estimate_tokens
+from async_utils import run_sync
 
 logger = get_logger()
 
@@ -13,15 +15,26 @@ class MoralScore(BaseModel):
     greed: int = Field(description="Change in greed score (-5 to +5)")
     reasoning: str = Field(description="Brief reason for the score")
 
+TRAITS = ["compassion", "courage", "greed"]
+
 class MoralEngine:
+    """
+    Scores choices with the LLM. One instance can serve every session: pass the
+    session's scores to update them, otherwise the instance's own `scores` are used.
+    """
     def __init__(self):
-        self.llm = ChatGroq(model=MODEL_FAST, temperature=0.5)
+        self.llm = ChatGroq(model=MODEL_FAST, temperature=0.5, max_retries=0)
         self.scores = {"compassion": 0, "courage": 0, "greed": 0}
         
         self.parser = JsonOutputParser(pydantic_object=MoralScore)
 
-    def score_choice(self, user_choice, story_context):
-        """Evaluates the user's last choice."""
+    def score_choice(self, user_choice, story_context, scores=None):
+        """Sync wrapper around ascore_choice."""
+        return run_sync(self.ascore_choice(user_choice, story_context, scores))
+
+    async def ascore_choice(self, user_choice, story_context, scores=None):
+        """Evaluates the user's last choice and applies the changes to `scores` (clamped)."""
+        scores = self.scores if scores is None else scores
         prompt = ChatPromptTemplate.from_messages([
             ("system", "You are a Moral Arbiter in a story game. Analyze the user's choice and assign score changes."),
             ("human", "Story Context: {context}\nUser Choice: {choice}\n\n{format_instructions}")
@@ -30,29 +43,42 @@ class MoralEngine:
         chain = prompt | self.llm | self.parser
         
         try:
-            result = chain.invoke({
+            inputs = {
                 "context": story_context[-500:], # Last 500 chars context
                 "choice": user_choice,
                 "format_instructions": self.parser.get_format_instructions()
-            })
+            }
+            result = await llm_scheduler.arun(
+                Priority.MORAL, lambda: chain.ainvoke(inputs),
+                estimated_tokens=estimate_tokens(inputs, max_output=120)
+            )
             
-            # Update internal state with clamping
-            for trait in ["compassion", "courage", "greed"]:
+            # Update scores with clamping
+            for trait in TRAITS:
                 change = result.get(trait, 0)
-                new_score = self.scores[trait] + change
+                new_score = scores[trait] + change
                 # Clamp score
-                self.scores[trait] = max(MORAL_SCORE_MIN, min(MORAL_SCORE_MAX, new_score))
+                scores[trait] = max(MORAL_SCORE_MIN, min(MORAL_SCORE_MAX, new_score))
             
             return result
         except Exception as e:
             logger.error(f"Moral Engine Error: {e}")
             return None
 
-    def generate_reflection(self):
+    def generate_reflection(self, scores=None):
+        """Sync wrapper around agenerate_reflection."""
+        return run_sync(self.agenerate_reflection(scores))
+
+    async def agenerate_reflection(self, scores=None):
         """Generates a final moral summary."""
+        scores = self.scores if scores is None else scores
+        final_scores = {trait: scores[trait] for trait in TRAITS}
         prompt = f"""
-        Based on these final scores: {self.scores},
+        Based on these final scores: {final_scores},
         write a 2-sentence spiritual reflection for the player, referencing concepts like Karma or Dharma if appropriate.
         """
-        response = self.llm.invoke(prompt)
+        response = await llm_scheduler.arun(
+            Priority.REFLECTION, lambda: self.llm.ainvoke(prompt),
+            estimated_tokens=estimate_tokens(prompt, max_output=120)
+        )
         return response.content
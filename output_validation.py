@@ -0,0 +1,162 @@
+import json
+import re
+import threading
+from pydantic import ValidationError
+from logger_config import get_logger
+
+logger = get_logger()
+
+class OutputValidationError(Exception):
+    """Raised when an LLM response cannot be repaired into the expected schema."""
+
+def strip_code_fences(text):
+    """Removes ```json ... ``` wrappers that models like to add around JSON."""
+    match = re.search(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", text, re.DOTALL)
+    return match.group(1).strip() if match else text.strip()
+
+def extract_json_object(text):
+    """
+    Returns the first JSON object in text, closing any string, array or object
+    left open by a truncated response. Returns None if there is no '{'.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+
+    stack = []
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            if not stack:
+                return text[start:i + 1]
+
+    # Truncated: close whatever is still open
+    candidate = text[start:].rstrip()
+    if escaped:
+        candidate = candidate[:-1]
+    if in_string:
+        candidate += '"'
+    if stack and stack[-1] == "}":
+        # Cut off after a key ('"emo' or '"emotion":'): drop the member that has no value
+        candidate = re.sub(r'([,{])\s*"(?:[^"\\]|\\.)*"\s*:?\s*$', r"\1", candidate)
+    candidate = re.sub(r",\s*$", "", candidate)
+    return candidate + "".join(reversed(stack))
+
+def _normalize_key(key):
+    return re.sub(r"[^a-z]", "", str(key).lower())
+
+class StructuredOutputValidator:
+    """
+    Validates LLM text against a pydantic model, trying cheap local repairs
+    (code-fence stripping, partial-JSON recovery, key and type coercion) before
+    giving up. Fields in `repair_defaults` are filled in when a truncated reply
+    was recovered without them. Tracks parse outcomes per model so failure rates
+    are visible.
+    """
+    def __init__(self, schema, aliases=None, repair_defaults=None):
+        self.schema = schema
+        self.repair_defaults = dict(repair_defaults or {})
+        self.fields = list(schema.model_fields)
+        self._aliases = {_normalize_key(f): f for f in self.fields}
+        for alias, field in (aliases or {}).items():
+            self._aliases[_normalize_key(alias)] = field
+        self._lock = threading.Lock()
+        self.stats = {}
+
+    def _coerce(self, data):
+        """Maps alias/mis-cased keys onto schema fields and flattens list values to strings."""
+        if not isinstance(data, dict):
+            raise OutputValidationError(f"Expected a JSON object, got {type(data).__name__}")
+        coerced = {}
+        for key, value in data.items():
+            field = self._aliases.get(_normalize_key(key))
+            if field is None or field in coerced:
+                continue
+            annotation = self.schema.model_fields[field].annotation
+            if annotation is str and isinstance(value, (list, tuple)):
+                value = ", ".join(str(v) for v in value)
+            elif annotation is str and value is not None and not isinstance(value, str):
+                value = str(value)
+            coerced[field] = value
+        return coerced
+
+    def _validate(self, data, defaults=None):
+        coerced = self._coerce(data)
+        for field, value in (defaults or {}).items():
+            coerced.setdefault(field, value)
+        try:
+            return self.schema.model_validate(coerced).model_dump()
+        except ValidationError as e:
+            raise OutputValidationError(str(e)) from e
+
+    def parse(self, text):
+        """Returns a validated dict or raises OutputValidationError. Does not record stats."""
+        return self.parse_with_outcome(text)[0]
+
+    def parse_with_outcome(self, text):
+        """
+        Like parse(), but returns (data, outcome) where outcome is 'ok' if the raw
+        reply was valid as-is and 'repaired' if local repair was needed.
+        """
+        text = text or ""
+        try:
+            return self._validate(json.loads(text)), "ok"
+        except (ValueError, OutputValidationError):
+            pass
+
+        candidate = extract_json_object(strip_code_fences(text))
+        if candidate is None:
+            raise OutputValidationError("No JSON object found in response")
+        try:
+            data = json.loads(candidate)
+        except ValueError as e:
+            raise OutputValidationError(f"Unrecoverable JSON: {e}") from e
+        # Truncation usually cuts off the trailing fields; defaults let the partial reply through
+        return self._validate(data, self.repair_defaults), "repaired"
+
+    @staticmethod
+    def _rates(counts):
+        """(raw parse-failure rate, share that needed a paid re-ask or failed outright)."""
+        total = max(1, sum(counts.values()))
+        return (total - counts["ok"]) / total, (counts["reask"] + counts["failed"]) / total
+
+    def record(self, model, outcome):
+        """
+        outcome: 'ok' (raw reply valid), 'repaired' (fixed locally), 'reask' (needed
+        a re-ask) or 'failed'. Everything but 'ok' counts as a first-pass parse failure.
+        """
+        with self._lock:
+            counts = self.stats.setdefault(model, {"ok": 0, "repaired": 0, "reask": 0, "failed": 0})
+            counts[outcome] += 1
+            total = sum(counts.values())
+            failure_rate, reask_rate = self._rates(counts)
+        if outcome != "ok":
+            log = logger.info if outcome == "repaired" else logger.warning
+            log(
+                f"Structured output {outcome} for {model}: first-pass parse-failure rate {failure_rate:.0%}, "
+                f"re-ask rate {reask_rate:.0%} over {total} calls"
+            )
+
+    def get_stats(self):
+        with self._lock:
+            stats = {}
+            for model, counts in self.stats.items():
+                failure_rate, reask_rate = self._rates(counts)
+                stats[model] = dict(counts, failure_rate=round(failure_rate, 3), reask_rate=round(reask_rate, 3))
+            return stats
@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import deque
+from enum import IntEnum
+from config import (
+    QOS_QUEUE_DEPTH_THRESHOLDS, QOS_LATENCY_THRESHOLDS, QOS_RECOVERY_RATIO,
+    QOS_MIN_DWELL, QOS_LATENCY_WINDOW, QOS_LATENCY_MAX_AGE
+)
+from llm_scheduler import llm_scheduler
+from logger_config import get_logger
+
+logger = get_logger()
+
+class QoSLevel(IntEnum):
+    """Degradation steps, each including everything shed by the levels below it."""
+    NORMAL = 0
+    NO_IMAGES = 1
+    NO_AUDIO = 2
+    REDUCED = 3     # shorter segments and fewer history turns
+
+QOS_MESSAGES = {
+    QoSLevel.NORMAL: "",
+    QoSLevel.NO_IMAGES: "⚡ High load: illustrations paused",
+    QoSLevel.NO_AUDIO: "⚡ High load: illustrations and narration paused",
+    QoSLevel.REDUCED: "⚡ Heavy load: illustrations and narration paused, shorter chapters",
+}
+
+class QoSController:
+    """
+    Load-shedding controller driven by LLM queue depth and recent turn latency.
+    Escalates one level at a time when either signal crosses the threshold for the
+    next level, and only steps back down once both signals fall below
+    QOS_RECOVERY_RATIO of the current level's threshold. Changes in either
+    direction are held for at least QOS_MIN_DWELL seconds to avoid flapping.
+    """
+    def __init__(self, scheduler=llm_scheduler):
+        self.scheduler = scheduler
+        self.level = QoSLevel.NORMAL
+        self._latencies = deque(maxlen=QOS_LATENCY_WINDOW)
+        self._lock = threading.Lock()
+        self._changed_at = float("-inf")
+
+    def record_latency(self, seconds):
+        with self._lock:
+            self._latencies.append((time.monotonic(), seconds))
+
+    def _latency_p90(self, now):
+        # Stale samples are ignored so an idle server can recover without new turns
+        ordered = sorted(s for t, s in self._latencies if now - t <= QOS_LATENCY_MAX_AGE)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))]
+
+    def _over(self, level, depth, latency, ratio=1.0):
+        """True if either signal exceeds the (scaled) threshold that triggers `level`."""
+        index = level - 1
+        return (depth >= QOS_QUEUE_DEPTH_THRESHOLDS[index] * ratio or
+                latency >= QOS_LATENCY_THRESHOLDS[index] * ratio)
+
+    def evaluate(self):
+        """Re-assesses load and returns the current QoSLevel."""
+        depth = self.scheduler.get_stats()["queue_depth"]
+        with self._lock:
+            now = time.monotonic()
+            latency = self._latency_p90(now)
+            if now - self._changed_at < QOS_MIN_DWELL:
+                return self.level
+
+            new_level = self.level
+            if self.level < QoSLevel.REDUCED and self._over(self.level + 1, depth, latency):
+                new_level = QoSLevel(self.level + 1)
+            elif self.level > QoSLevel.NORMAL and not self._over(self.level, depth, latency, QOS_RECOVERY_RATIO):
+                new_level = QoSLevel(self.level - 1)
+
+            if new_level != self.level:
+                logger.warning(
+                    f"QoS: {self.level.name} -> {new_level.name} "
+                    f"(queue depth {depth}, p90 turn latency {latency:.1f}s)"
+                )
+                self.level = new_level
+                self._changed_at = now
+            return self.level
+
+    def status_message(self, level=None):
+        return QOS_MESSAGES[self.level if level is None else level]
@@ -0,0 +1,86 @@
+import os
+import re
+import threading
+from config import SCENE_REUSE_THRESHOLD, SCENE_VARIANT_THRESHOLD, SCENE_VARIANT_COST
+from logger_config import get_logger
+
+logger = get_logger()
+
+_STOPWORDS = {
+    "the", "and", "you", "your", "with", "for", "that", "this", "are", "was", "were", "his", "her",
+    "their", "from", "into", "onto", "but", "not", "have", "has", "had", "they", "them", "she", "him",
+    "its", "as", "who", "what", "will", "would", "can", "could", "all", "one", "out", "over", "then",
+    "choice", "choose", "shot", "lighting", "palette", "color", "camera", "angle",
+}
+
+def _tokens(text):
+    """Lower-cased content words, used as a cheap bag-of-words for overlap."""
+    return {w for w in re.findall(r"[a-z]+", (text or "").lower()) if len(w) > 2 and w not in _STOPWORDS}
+
+def _jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+def scene_signature(story_text, emotion, visual_keywords):
+    """Compact, JSON-safe description of a scene for storing in session state."""
+    return {
+        "emotion": (emotion or "neutral").lower(),
+        "keywords": sorted(_tokens(visual_keywords)),
+        "story": sorted(_tokens(story_text)),
+    }
+
+class SceneChangeDetector:
+    """
+    Decides whether a new turn needs a fresh illustration.
+    Similarity is a weighted blend of emotion match, visual keyword overlap and
+    story-text overlap (Jaccard on content words). Above SCENE_REUSE_THRESHOLD the
+    previous image is reused; above SCENE_VARIANT_THRESHOLD a cheaper draft render
+    is requested; otherwise a full render.
+    """
+    RENDER = "render"
+    VARIANT = "variant"
+    REUSE = "reuse"
+
+    def __init__(self, reuse_threshold=SCENE_REUSE_THRESHOLD, variant_threshold=SCENE_VARIANT_THRESHOLD):
+        self.reuse_threshold = reuse_threshold
+        self.variant_threshold = variant_threshold
+        self._lock = threading.Lock()
+        self.stats = {"render": 0, "variant": 0, "reuse": 0}
+
+    def similarity(self, previous, current):
+        emotion = 1.0 if previous["emotion"] == current["emotion"] else 0.0
+        keywords = _jaccard(set(previous["keywords"]), set(current["keywords"]))
+        story = _jaccard(set(previous["story"]), set(current["story"]))
+        return 0.2 * emotion + 0.4 * keywords + 0.4 * story
+
+    def decide(self, last_scene, signature):
+        """
+        Returns (decision, similarity) for the new signature given the session's
+        last scene ({"signature": ..., "image": path}) or None.
+        """
+        score = 0.0
+        decision = self.RENDER
+        if last_scene and last_scene.get("signature"):
+            score = self.similarity(last_scene["signature"], signature)
+            # Only stored files can be reused (none in in-memory mode); they may also have been evicted
+            image = last_scene.get("image")
+            has_image = isinstance(image, str) and os.path.exists(image)
+            if score >= self.reuse_threshold and has_image:
+                decision = self.REUSE
+            elif score >= self.variant_threshold:
+                decision = self.VARIANT
+
+        with self._lock:
+            self.stats[decision] += 1
+        logger.info(f"SceneChange: {decision} (similarity {score:.2f}) | {self.savings_summary()}")
+        return decision, score
+
+    def savings_summary(self):
+        with self._lock:
+            total = sum(self.stats.values())
+            saved = self.stats["reuse"] + self.stats["variant"] * (1.0 - SCENE_VARIANT_COST)
+            return (
+                f"{self.stats['reuse']} reused, {self.stats['variant']} drafts, "
+                f"{self.stats['render']} full renders; saved {saved:.1f} of {total} render-equivalents"
+            )
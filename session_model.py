@@ -0,0 +1,143 @@
+import marshal
+import random
+from array import array
+from dataclasses import dataclass, field
+from config import MORAL_SCORE_MIN, MORAL_SCORE_MAX, DEFAULT_LANGUAGE
+
+TRAITS = ("compassion", "courage", "greed")
+_TRAIT_INDEX = {trait: i for i, trait in enumerate(TRAITS)}
+
+# History roles are stored as small ints instead of langchain message objects
+ROLE_SYSTEM, ROLE_HUMAN, ROLE_AI = 0, 1, 2
+ROLE_CODES = {"system": ROLE_SYSTEM, "human": ROLE_HUMAN, "ai": ROLE_AI}
+ROLE_NAMES = {code: name for name, code in ROLE_CODES.items()}
+
+_FORMAT_VERSION = 1
+
+class Character:
+    # Slotted: one of these lives in every active session
+    __slots__ = ("id", "name", "culture", "age", "traits", "voice_id", "face_seed")
+
+    def __init__(self, name, culture, age=20, traits=None, voice_id="21m00Tcm4TlvDq8ikWAM", face_seed=None):
+        self.id = f"char_{random.randint(1000, 9999)}"
+        self.name = name
+        self.culture = culture
+        self.age = age
+        self.traits = traits if traits else []
+        self.voice_id = voice_id
+        # Persistent seed for image generation consistency
+        self.face_seed = face_seed if face_seed else random.randint(10000, 99999)
+
+    def add_trait(self, trait):
+        if trait not in self.traits:
+            self.traits.append(trait)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "culture": self.culture,
+            "age": self.age,
+            "traits": self.traits,
+            "voice_id": self.voice_id,
+            "face_seed": self.face_seed
+        }
+
+    @staticmethod
+    def from_dict(data):
+        return Character(
+            name=data["name"],
+            culture=data["culture"],
+            age=data["age"],
+            traits=data["traits"],
+            voice_id=data["voice_id"],
+            face_seed=data["face_seed"]
+        )
+
+class MoralScores:
+    """Three clamped karma scores packed into a signed-byte array, addressable by trait name."""
+    __slots__ = ("values",)
+
+    def __init__(self, values=None):
+        self.values = array("b", values if values is not None else (0, 0, 0))
+
+    def __getitem__(self, trait):
+        return self.values[_TRAIT_INDEX[trait]]
+
+    def __setitem__(self, trait, value):
+        self.values[_TRAIT_INDEX[trait]] = max(MORAL_SCORE_MIN, min(MORAL_SCORE_MAX, int(value)))
+
+    def get(self, trait, default=0):
+        index = _TRAIT_INDEX.get(trait)
+        return default if index is None else self.values[index]
+
+    def to_dict(self):
+        return {trait: self.values[i] for i, trait in enumerate(TRAITS)}
+
+    def display(self):
+        return " | ".join(f"{trait.title()}: {self.values[i]}" for i, trait in enumerate(TRAITS))
+
+@dataclass(slots=True)
+class SessionState:
+    """
+    Everything one player's journey needs between turns, in compact form:
+    the Character, byte-packed scores and history as (role_code, content) tuples.
+    Held directly in gr.State; to_bytes/from_bytes give a fast binary snapshot
+    for in-process use (e.g. parking idle sessions). The encoding is marshal, so
+    it is only readable by the same Python version and must never be loaded from
+    untrusted input; it is not a storage or wire format.
+    """
+    session_id: str
+    character: Character
+    language: str = DEFAULT_LANGUAGE
+    scores: MoralScores = field(default_factory=MoralScores)
+    history: list = field(default_factory=list)
+    last_scene: dict = None
+
+    def set_history(self, records):
+        """Stores (role_name, content) pairs as exported by StoryTeller."""
+        self.history = [(ROLE_CODES[role], content) for role, content in records]
+
+    def history_records(self):
+        """(role_name, content) pairs for StoryTeller.restore_history."""
+        return [(ROLE_NAMES[code], content) for code, content in self.history]
+
+    def last_story_text(self):
+        return self.history[-1][1] if self.history else ""
+
+    def to_bytes(self):
+        """Header (format version, marshal version) followed by a marshalled tuple."""
+        c = self.character
+        scene = None
+        if self.last_scene:
+            image = self.last_scene.get("image")
+            signature = self.last_scene.get("signature") or {}
+            scene = (
+                image if isinstance(image, str) else None,  # in-memory images are not persisted
+                signature.get("emotion", ""),
+                tuple(signature.get("keywords", ())),
+                tuple(signature.get("story", ())),
+            )
+        return bytes((_FORMAT_VERSION, marshal.version)) + marshal.dumps((
+            self.session_id,
+            self.language,
+            (c.id, c.name, c.culture, c.age, tuple(c.traits), c.voice_id, c.face_seed),
+            self.scores.values.tobytes(),
+            tuple(self.history),
+            scene,
+        ))
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Inverse of to_bytes; trusted, same-interpreter data only."""
+        if len(data) < 2 or data[0] != _FORMAT_VERSION or data[1] != marshal.version:
+            raise ValueError("Unsupported session state format")
+        session_id, language, char, scores, history, scene = marshal.loads(data[2:])
+        char_id, name, culture, age, traits, voice_id, face_seed = char
+        character = Character(name, culture, age=age, traits=list(traits), voice_id=voice_id, face_seed=face_seed)
+        character.id = char_id
+        last_scene = None
+        if scene:
+            image, emotion, keywords, story = scene
+            last_scene = {"image": image, "signature": {"emotion": emotion, "keywords": list(keywords), "story": list(story)}}
+        return cls(session_id, character, language, MoralScores(array("b", scores)), list(history), last_scene)
@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from config import SINGLE_FLIGHT_TIMEOUT
+from logger_config import get_logger
+
+logger = get_logger()
+
+class SingleFlightTimeout(Exception):
+    """Raised when a waiter gives up on an in-flight call it joined."""
+
+class _LeaderAbandoned(Exception):
+    """Internal: the leader was cancelled before finishing, so waiters elect a new one."""
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent requests into a single upstream call.
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is in flight wait on the same result or exception.
+    If the leader is cancelled, a waiter takes over instead of inheriting the
+    cancellation. Nothing is cached once the call completes.
+    """
+    def __init__(self, name="llm", timeout=SINGLE_FLIGHT_TIMEOUT):
+        self.name = name
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.stats = {"calls": 0, "upstream": 0, "saved": 0, "timeouts": 0, "errors": 0, "abandoned": 0}
+
+    def _join(self, key, rejoin=False):
+        """Returns (future, is_leader) for the key, registering a new call if none is in flight."""
+        with self._lock:
+            if not rejoin:
+                self.stats["calls"] += 1
+            future = self._calls.get(key)
+            if future is not None:
+                if not rejoin:
+                    self.stats["saved"] += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self.stats["upstream"] += 1
+            if rejoin:
+                # This caller was counted as saved when it first joined
+                self.stats["saved"] -= 1
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            self._calls.pop(key, None)
+            if isinstance(error, _LeaderAbandoned):
+                self.stats["abandoned"] += 1
+            elif error is not None:
+                self.stats["errors"] += 1
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _fail(self, key, future, error):
+        # Only real errors are shared; cancellation belongs to the leader's own caller
+        self._finish(key, future, error=error if isinstance(error, Exception) else _LeaderAbandoned())
+
+    def _timed_out(self):
+        with self._lock:
+            self.stats["timeouts"] += 1
+        return SingleFlightTimeout(f"Timed out waiting for in-flight call '{self.name}'")
+
+    def do(self, key, fn, timeout=None):
+        """
+        Runs fn() once per key among concurrent callers and returns its result.
+        Errors raised by the leader are re-raised in every waiter.
+        """
+        expires_at = time.monotonic() + (timeout if timeout is not None else self.timeout)
+        rejoin = False
+        while True:
+            future, is_leader = self._join(key, rejoin)
+            if is_leader:
+                try:
+                    result = fn()
+                except BaseException as e:
+                    self._fail(key, future, e)
+                    raise
+                self._finish(key, future, result=result)
+                return result
+
+            if not rejoin:
+                logger.info(f"SingleFlight[{self.name}]: coalesced duplicate request ({self.stats['saved']} upstream calls saved)")
+            try:
+                return future.result(timeout=max(0.0, expires_at - time.monotonic()))
+            except FutureTimeoutError:
+                raise self._timed_out()
+            except _LeaderAbandoned:
+                rejoin = True
+
+    async def ado(self, key, coro_fn, timeout=None):
+        """
+        Async counterpart of do(): awaits coro_fn() once per key. Sync and async
+        callers share the same in-flight calls, even across event loops.
+        """
+        expires_at = time.monotonic() + (timeout if timeout is not None else self.timeout)
+        rejoin = False
+        while True:
+            future, is_leader = self._join(key, rejoin)
+            if is_leader:
+                try:
+                    result = await coro_fn()
+                except BaseException as e:
+                    self._fail(key, future, e)
+                    raise
+                self._finish(key, future, result=result)
+                return result
+
+            if not rejoin:
+                logger.info(f"SingleFlight[{self.name}]: coalesced duplicate request ({self.stats['saved']} upstream calls saved)")
+            try:
+                # Shielded so a waiter timing out never cancels the leader's call
+                return await asyncio.wait_for(
+                    asyncio.shield(asyncio.wrap_future(future)),
+                    timeout=max(0.0, expires_at - time.monotonic())
+                )
+            except asyncio.TimeoutError:
+                raise self._timed_out()
+            except _LeaderAbandoned:
+                rejoin = True
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, in_flight=len(self._calls))
+
+# Shared across engines so identical prompts from different sessions coalesce
+llm_single_flight = SingleFlight("llm")
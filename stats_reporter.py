@@ -0,0 +1,45 @@
+import threading
+from config import STATS_LOG_INTERVAL
+from logger_config import get_logger
+
+logger = get_logger()
+
+class StatsReporter:
+    """
+    Logs each registered component's get_stats() snapshot every `interval`
+    seconds from a daemon thread, one line per component, so queue depth, wait
+    times and savings can be read back from the logs for capacity sizing.
+    """
+    def __init__(self, interval=STATS_LOG_INTERVAL):
+        self.interval = interval
+        self._sources = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def register(self, name, get_stats):
+        self._sources[name] = get_stats
+
+    def report(self):
+        for name, get_stats in list(self._sources.items()):
+            try:
+                stats = get_stats()
+            except Exception as e:
+                logger.warning(f"Stats[{name}] unavailable: {e}")
+                continue
+            # Structured: a `stats` object in JSON lines output, appended as JSON in text mode
+            logger.info(f"Stats[{name}]", extra={"stats": stats})
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.report()
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="stats-reporter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+stats_reporter = StatsReporter()
@@ -0,0 +1,91 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from config import STORY_CACHE_PATH
+from logger_config import get_logger
+
+logger = get_logger()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stories (
+    theme TEXT NOT NULL,
+    language TEXT NOT NULL,
+    created REAL NOT NULL,
+    payload BLOB NOT NULL,
+    image BLOB,
+    image_ext TEXT,
+    thumbnail BLOB,
+    PRIMARY KEY (theme, language)
+)
+"""
+
+def normalize_theme(theme):
+    return " ".join((theme or "").lower().split())
+
+class StoryCache:
+    """
+    Compact on-disk store of pre-generated openings (one SQLite file).
+    Each row holds a zlib-compressed JSON payload (story data, knowledge block,
+    character and prompt history) plus the transcoded scene image. Written by
+    batch_generate.py and read by the app as a warm cache.
+    """
+    def __init__(self, path=STORY_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(_SCHEMA)
+            self._conn.commit()
+
+    @classmethod
+    def open_existing(cls, path=STORY_CACHE_PATH):
+        """Returns a cache for an existing file, or None so callers can skip the warm path."""
+        if not os.path.exists(path):
+            return None
+        try:
+            return cls(path)
+        except sqlite3.Error as e:
+            logger.warning(f"StoryCache: could not open {path} ({e})")
+            return None
+
+    def has(self, theme, language):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM stories WHERE theme = ? AND language = ?",
+                (normalize_theme(theme), language)
+            ).fetchone()
+        return row is not None
+
+    def put(self, theme, language, payload, image=None, image_ext=None, thumbnail=None):
+        blob = zlib.compress(json.dumps(payload, ensure_ascii=False).encode("utf-8"), 6)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO stories VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (normalize_theme(theme), language, time.time(), blob, image, image_ext, thumbnail)
+            )
+            self._conn.commit()
+
+    def get(self, theme, language):
+        """Returns the cached entry as a dict (payload keys plus image fields), or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, image, image_ext, thumbnail FROM stories WHERE theme = ? AND language = ?",
+                (normalize_theme(theme), language)
+            ).fetchone()
+        if row is None:
+            return None
+        entry = json.loads(zlib.decompress(row[0]).decode("utf-8"))
+        entry.update({"image": row[1], "image_ext": row[2], "thumbnail": row[3]})
+        return entry
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM stories").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
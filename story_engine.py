@@ -1,10 +1,17 @@
-from config import MODEL_CREATIVE, MAX_HISTORY_TURNS
+import copy
+import json
+import threading
+from contextlib import contextmanager
+from config import MODEL_CREATIVE, MAX_HISTORY_TURNS, REDUCED_HISTORY_TURNS, STRUCTURED_OUTPUT_MAX_REASKS
 from langchain_core.output_parsers import JsonOutputParser
 from pydantic import BaseModel, Field
 from langchain_groq import ChatGroq
-from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 from culture_engine import CultureEngine
 from logger_config import get_logger
+from llm_scheduler import llm_scheduler, Priority, estimate_tokens
+from output_validation import StructuredOutputValidator, OutputValidationError
+from async_utils import run_sync
 
 logger = get_logger()
 
@@ -13,13 +20,30 @@ class StoryOutput(BaseModel):
     emotion: str = Field(description="One word emotion: joy, sadness, anger, fear, peace, mystery")
     visual_keywords: str = Field(description="Comma-separated visual keywords(Camera Angle, Lighting, Color Palette)")
 
+# Keys models commonly return instead of the schema's
+STORY_OUTPUT_ALIASES = {
+    "story": "story_text", "text": "story_text", "narrative": "story_text", "content": "story_text",
+    "mood": "emotion", "tone": "emotion",
+    "keywords": "visual_keywords", "visuals": "visual_keywords", "visual": "visual_keywords",
+}
+
+REPAIR_PROMPT = (
+    "Your previous reply could not be parsed. Reply again with ONLY a valid JSON object "
+    "with exactly these string keys: 'story_text', 'emotion', 'visual_keywords'. "
+    "No markdown, no commentary."
+)
+
 class StoryTeller:
-    def __init__(self):
-        self.llm = ChatGroq(model=MODEL_CREATIVE)
+    def __init__(self, culture_engine=None):
+        self.llm = ChatGroq(model=MODEL_CREATIVE, max_retries=0)
         self.history = []
-        self.culture_engine = CultureEngine()
+        self._turn_lock = threading.Lock()
+        self.culture_engine = culture_engine or CultureEngine()
         self.language_instruction = "Narrate in English."
         self.parser = JsonOutputParser(pydantic_object=StoryOutput)
+        self.validator = StructuredOutputValidator(
+            StoryOutput, aliases=STORY_OUTPUT_ALIASES, repair_defaults={"emotion": "neutral", "visual_keywords": ""}
+        )
 
     def set_language(self, language="English"):
         if language and language.lower() != "english":
@@ -33,13 +57,13 @@ class StoryTeller:
         else:
             self.language_instruction = "Narrate in English."
 
-    def _trim_history(self):
+    def _trim_history(self, max_turns=MAX_HISTORY_TURNS):
         """Trims history to keep only the most recent interactions."""
         try:
             # Keep system prompt (index 0) + last N turns
-            if len(self.history) > MAX_HISTORY_TURNS:
+            if len(self.history) > max_turns:
                 # Safely slice the last (N-1) elements
-                keep_count = MAX_HISTORY_TURNS - 1
+                keep_count = max_turns - 1
                 recent_history = self.history[-keep_count:]
                 self.history = [self.history[0]] + recent_history
         except Exception as e:
@@ -48,13 +72,106 @@ class StoryTeller:
             if len(self.history) > 5:
                 self.history = [self.history[0]] + self.history[-5:]
 
+    async def _ainvoke_llm(self, messages=None):
+        """Sends the current history (or given messages) through the shared scheduler at story priority."""
+        messages = list(self.history if messages is None else messages)
+        return await llm_scheduler.arun(
+            Priority.STORY, lambda: self.llm.ainvoke(messages),
+            estimated_tokens=estimate_tokens(messages, max_output=400)
+        )
+
+    async def _agenerate_structured(self):
+        """
+        Invokes the LLM and returns a validated StoryOutput dict.
+        Local repair is tried first; a bounded re-ask is the last resort. Only the
+        clean, re-serialized JSON is appended to history, never an unparseable reply.
+        """
+        response = await self._ainvoke_llm()
+        try:
+            data, outcome = self.validator.parse_with_outcome(response.content)
+            self.validator.record(MODEL_CREATIVE, outcome)
+        except OutputValidationError as e:
+            logger.warning(f"Story output failed validation ({e}); re-asking")
+            data = await self._areask(response.content)
+        self.history.append(AIMessage(content=json.dumps(data, ensure_ascii=False)))
+        return data
+
+    async def _areask(self, bad_content):
+        """Asks the model to correct its reply, without adding the exchange to history."""
+        error = None
+        for _ in range(STRUCTURED_OUTPUT_MAX_REASKS):
+            messages = self.history + [AIMessage(content=bad_content), HumanMessage(content=REPAIR_PROMPT)]
+            response = await self._ainvoke_llm(messages)
+            try:
+                data = self.validator.parse(response.content)
+                self.validator.record(MODEL_CREATIVE, "reask")
+                return data
+            except OutputValidationError as e:
+                bad_content, error = response.content, e
+        self.validator.record(MODEL_CREATIVE, "failed")
+        raise error or OutputValidationError("Story output invalid and re-ask disabled")
+
+    def fork(self, records=None, language="English"):
+        """
+        Per-session view of this StoryTeller: shares the LLM client, culture engine
+        and validator, but owns its history and language. Cheap enough to do every turn.
+        """
+        session_teller = copy.copy(self)
+        session_teller.history = []
+        session_teller._turn_lock = threading.Lock()
+        if records:
+            session_teller.restore_history(records, language)
+        else:
+            session_teller.set_language(language)
+        return session_teller
+
+    @contextmanager
+    def _exclusive_turn(self):
+        """
+        One turn at a time per instance: overlapping turns would interleave two
+        players' messages in self.history, so they fail loudly instead.
+        """
+        if not self._turn_lock.acquire(blocking=False):
+            raise RuntimeError("StoryTeller is already running a turn; use fork() for each concurrent session")
+        try:
+            yield
+        finally:
+            self._turn_lock.release()
+
+    def export_history(self):
+        """History as plain (role, content) pairs, e.g. for the batch warm cache."""
+        roles = {SystemMessage: "system", HumanMessage: "human", AIMessage: "ai"}
+        return [(roles.get(type(m), "ai"), m.content) for m in self.history]
+
+    def restore_history(self, records, language="English"):
+        """Resumes a story from exported (role, content) pairs."""
+        classes = {"system": SystemMessage, "human": HumanMessage, "ai": AIMessage}
+        self.set_language(language)
+        self.history = [classes[role](content=content) for role, content in records]
+
     def start_story(self, theme, language="English"):
-        """Initializes the story based on a theme and cultural context."""
+        """Sync wrapper around astart_story."""
+        return run_sync(self.astart_story(theme, language))
+
+    def continue_story(self, user_choice, brief=False):
+        """Sync wrapper around acontinue_story."""
+        return run_sync(self.acontinue_story(user_choice, brief))
+
+    async def astart_story(self, theme, language="English", context_str=None):
+        """
+        Initializes the story based on a theme and cultural context.
+        A precomputed `context_str` (knowledge block) skips the culture lookup.
+        """
+        with self._exclusive_turn():
+            return await self._astart_story(theme, language, context_str)
+
+    async def _astart_story(self, theme, language, context_str):
         self.set_language(language)
         
         # 1. Retrieve Cultural Context (RAG)
-        logger.info(f"Retrieving cultural context for: {theme}")
-        context_str = self.culture_engine.get_context_string(theme)
+        if context_str is None:
+            logger.info(f"Retrieving cultural context for: {theme}")
+            context_str = await self.culture_engine.aget_context_string(theme)
         
         if context_str:
             grounding_instruction = (
@@ -87,10 +204,7 @@ class StoryTeller:
         self.history.append(HumanMessage(content=prompt))
         
         try:
-            response = self.llm.invoke(self.history)
-            self.history.append(response)
-            parsed_response = self.parser.parse(response.content)
-            return parsed_response
+            return await self._agenerate_structured()
         except Exception as e:
             logger.error(f"Story Start Error: {e}")
             # Fallback
@@ -100,18 +214,29 @@ class StoryTeller:
                 "visual_keywords": "foggy, ancient, mysterious"
             }
 
-    def continue_story(self, user_choice):
-        """Continues the story based on user's choice."""
-        self._trim_history()
+    async def acontinue_story(self, user_choice, brief=False):
+        """
+        Continues the story based on user's choice.
+        `brief` is set by the QoS controller under load: fewer history turns and a shorter segment.
+        """
+        with self._exclusive_turn():
+            return await self._acontinue_story(user_choice, brief)
+
+    async def _acontinue_story(self, user_choice, brief):
+        if brief:
+            self._trim_history(REDUCED_HISTORY_TURNS)
+            user_choice = f"{user_choice}\n(Keep this segment under 80 words.)"
+        else:
+            self._trim_history()
         self.history.append(HumanMessage(content=user_choice))
         
         try:
-            response = self.llm.invoke(self.history)
-            self.history.append(response)
-            parsed_response = self.parser.parse(response.content)
-            return parsed_response
+            return await self._agenerate_structured()
         except Exception as e:
             logger.error(f"Story Continue Error: {e}")
+            # Drop the unanswered choice so history keeps alternating human/AI turns
+            if self.history and isinstance(self.history[-1], HumanMessage):
+                self.history.pop()
             return {
                 "story_text": "The story continues... (Error generating segment)",
                 "emotion": "neutral",
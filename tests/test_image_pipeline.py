@@ -0,0 +1,38 @@
+import io
+import pytest
+from image_pipeline import ImagePipeline
+
+Image = pytest.importorskip("PIL.Image")
+
+def _png_with_metadata():
+    from PIL import PngImagePlugin
+    info = PngImagePlugin.PngInfo()
+    info.add_text("Comment", "generated by flux")
+    out = io.BytesIO()
+    Image.new("RGB", (256, 192), (180, 90, 30)).save(out, "PNG", pnginfo=info)
+    return out.getvalue()
+
+def test_process_returns_stripped_webp_and_thumbnail():
+    pipeline = ImagePipeline(fmt="webp", quality=70, thumb_size=64, workers=1)
+    try:
+        result = pipeline.process(_png_with_metadata())
+    finally:
+        pipeline.shutdown()
+
+    assert result.ext == "webp"
+    image = Image.open(io.BytesIO(result.data))
+    assert image.format == "WEBP" and image.size == (256, 192)
+    assert not {"exif", "icc_profile", "xmp", "Comment"} & set(image.info)
+
+    thumb = Image.open(io.BytesIO(result.thumbnail))
+    assert thumb.format == "JPEG" and max(thumb.size) <= 64
+    assert pipeline.get_stats()["images"] == 1
+
+def test_undecodable_bytes_fall_back_to_original():
+    pipeline = ImagePipeline(workers=1)
+    try:
+        result = pipeline.process(b"not an image", source_ext="png")
+    finally:
+        pipeline.shutdown()
+    assert result.data == b"not an image" and result.ext == "png"
+    assert pipeline.get_stats()["failures"] == 1
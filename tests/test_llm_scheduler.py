@@ -0,0 +1,164 @@
+import asyncio
+import threading
+import time
+import pytest
+from config import LLM_TRANSIENT_BACKOFF, LLM_TRANSIENT_RETRIES
+from llm_scheduler import LLMScheduler, Priority, SchedulerDeadlineExceeded
+
+def _starved(requests_per_minute=1):
+    """Scheduler with an empty request bucket, so every caller has to queue."""
+    scheduler = LLMScheduler(requests_per_minute=requests_per_minute, tokens_per_minute=100000)
+    scheduler.request_bucket.tokens = 0
+    return scheduler
+
+async def _ok():
+    return "ok"
+
+def test_cancelled_waiter_leaves_queue():
+    async def scenario():
+        scheduler = _starved()
+        waiter = asyncio.create_task(scheduler.arun(Priority.STORY, _ok, deadline=30))
+        await asyncio.sleep(0.1)
+        assert scheduler.get_stats()["queue_depth"] == 1
+
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        stats = scheduler.get_stats()
+        assert stats["queue_depth"] == 0
+        assert stats["cancelled"] == 1
+
+        # The next caller is served as soon as capacity returns, not after the orphan's deadline
+        scheduler.request_bucket.tokens = 1
+        assert await scheduler.arun(Priority.MORAL, _ok, deadline=1) == "ok"
+
+    asyncio.run(scenario())
+
+def test_dispatches_by_priority_then_fifo():
+    async def scenario():
+        scheduler = _starved(requests_per_minute=600)
+        order = []
+
+        def call(name):
+            async def fn():
+                order.append(name)
+            return fn
+
+        jobs = [
+            ("reflection", Priority.REFLECTION), ("moral-1", Priority.MORAL),
+            ("story", Priority.STORY), ("moral-2", Priority.MORAL),
+        ]
+        tasks = [asyncio.create_task(scheduler.arun(p, call(name), deadline=5)) for name, p in jobs]
+        await asyncio.gather(*tasks)
+        assert order == ["story", "moral-1", "moral-2", "reflection"]
+
+    asyncio.run(scenario())
+
+def test_sync_callers_follow_priority():
+    scheduler = _starved(requests_per_minute=600)
+    order = []
+    threads = [
+        threading.Thread(target=scheduler.run, args=(p, lambda name=name: order.append(name)), kwargs={"deadline": 5})
+        for name, p in [("cine", Priority.CINEMATOGRAPHY), ("story", Priority.STORY)]
+    ]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join()
+    assert order == ["story", "cine"]
+
+def test_deadline_expiry_raises_and_clears_queue():
+    scheduler = _starved()
+    with pytest.raises(SchedulerDeadlineExceeded):
+        scheduler.run(Priority.STORY, lambda: "never", deadline=0.2)
+    stats = scheduler.get_stats()
+    assert stats["expired"] == 1 and stats["cancelled"] == 0 and stats["queue_depth"] == 0
+
+class _RateLimited(Exception):
+    def __init__(self, retry_after):
+        super().__init__("429")
+        self.status_code = 429
+        self.response = type("Response", (), {"headers": {"retry-after": str(retry_after)}, "status_code": 429})()
+
+def test_retry_after_pauses_and_retries():
+    async def scenario():
+        scheduler = LLMScheduler(requests_per_minute=600, tokens_per_minute=100000)
+        attempts = []
+
+        async def flaky():
+            attempts.append(time.monotonic())
+            if len(attempts) == 1:
+                raise _RateLimited(0.3)
+            return "ok"
+
+        assert await scheduler.arun(Priority.STORY, flaky, deadline=5) == "ok"
+        assert len(attempts) == 2
+        assert attempts[1] - attempts[0] >= 0.3
+        assert scheduler.get_stats()["rate_limited"] == 1
+
+    asyncio.run(scenario())
+
+def test_retry_after_beyond_deadline_gives_up():
+    scheduler = LLMScheduler(requests_per_minute=600, tokens_per_minute=100000)
+
+    def limited():
+        raise _RateLimited(10)
+
+    with pytest.raises(SchedulerDeadlineExceeded):
+        scheduler.run(Priority.STORY, limited, deadline=1)
+
+def test_non_rate_limit_errors_propagate():
+    scheduler = LLMScheduler(requests_per_minute=600, tokens_per_minute=100000)
+
+    def broken():
+        raise ValueError("bad prompt")
+
+    with pytest.raises(ValueError):
+        scheduler.run(Priority.STORY, broken)
+    assert scheduler.get_stats()["rate_limited"] == 0
+
+class _ServerError(Exception):
+    status_code = 503
+
+def test_transient_errors_retry_with_backoff():
+    async def scenario():
+        scheduler = LLMScheduler(requests_per_minute=600, tokens_per_minute=100000)
+        attempts = []
+
+        async def flaky():
+            attempts.append(time.monotonic())
+            if len(attempts) < 3:
+                raise ConnectionError("connection reset")
+            return "ok"
+
+        assert await scheduler.arun(Priority.STORY, flaky, deadline=5) == "ok"
+        assert len(attempts) == 3
+        assert attempts[2] - attempts[0] >= LLM_TRANSIENT_BACKOFF * 3
+        stats = scheduler.get_stats()
+        assert stats["transient_retries"] == 2 and stats["rate_limited"] == 0
+
+    asyncio.run(scenario())
+
+def test_transient_retries_are_bounded():
+    scheduler = LLMScheduler(requests_per_minute=600, tokens_per_minute=100000)
+    calls = []
+
+    def down():
+        calls.append(1)
+        raise _ServerError("service unavailable")
+
+    with pytest.raises(_ServerError):
+        scheduler.run(Priority.STORY, down, deadline=10)
+    assert len(calls) == LLM_TRANSIENT_RETRIES + 1
+
+def test_transient_backoff_respects_deadline():
+    scheduler = LLMScheduler(requests_per_minute=600, tokens_per_minute=100000)
+    calls = []
+
+    def down():
+        calls.append(1)
+        raise TimeoutError("read timeout")
+
+    with pytest.raises(TimeoutError):
+        scheduler.run(Priority.STORY, down, deadline=LLM_TRANSIENT_BACKOFF / 2)
+    assert len(calls) == 1
@@ -0,0 +1,58 @@
+import os
+import time
+import media_store as media_store_module
+from media_store import MediaStore
+
+def _store(tmp_path, **kwargs):
+    store = MediaStore(root=str(tmp_path / "media"), **kwargs)
+    # Sweeps run explicitly in these tests, never on the background thread
+    store._ensure_sweeper = lambda: None
+    return store
+
+def _age(path, seconds):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+def test_write_bytes_is_atomic_and_accounted(tmp_path):
+    store = _store(tmp_path)
+    path = store.write_bytes("s1", "scene", "webp", b"x" * 100)
+    assert open(path, "rb").read() == b"x" * 100
+    assert not [n for n in os.listdir(os.path.dirname(path)) if n.startswith(".tmp_")]
+    assert store._usage == 100
+
+def test_sweep_evicts_expired_files(tmp_path):
+    store = _store(tmp_path, max_age=60)
+    old = store.write_bytes("s1", "scene", "webp", b"o" * 10)
+    new = store.write_bytes("s1", "scene", "webp", b"n" * 10)
+    _age(old, 120)
+    assert store.sweep() == 10
+    assert not os.path.exists(old) and os.path.exists(new)
+    assert store._usage == 10
+
+def test_sweep_evicts_oldest_over_quota(tmp_path):
+    store = _store(tmp_path, max_bytes=250)
+    paths = [store.write_bytes("s1", "scene", "webp", b"x" * 100) for _ in range(3)]
+    for i, path in enumerate(paths):
+        _age(path, 30 - i)
+    store.sweep()
+    # Down to 90% of quota, oldest first
+    assert [os.path.exists(p) for p in paths] == [False, True, True]
+
+def test_sweep_keeps_recent_empty_session_dirs(tmp_path, monkeypatch):
+    monkeypatch.setattr(media_store_module, "MEDIA_DIR_GRACE", 60)
+    store = _store(tmp_path)
+    fresh = store.session_dir("fresh")
+    idle = store.session_dir("idle")
+    _age(idle, 120)
+    store.sweep()
+    assert os.path.isdir(fresh) and not os.path.exists(idle)
+
+def test_drop_session_subtracts_only_that_session(tmp_path):
+    store = _store(tmp_path)
+    store.write_bytes("keep", "scene", "webp", b"k" * 40)
+    dropped = store.write_bytes("drop", "scene", "webp", b"d" * 60)
+    store.drop_session("drop")
+    assert not os.path.exists(os.path.dirname(dropped))
+    assert store._usage == 40
+    store.drop_session("never-existed")
+    assert not os.path.exists(store._session_path("never-existed"))
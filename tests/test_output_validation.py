@@ -0,0 +1,60 @@
+import pytest
+from pydantic import BaseModel
+from output_validation import StructuredOutputValidator, OutputValidationError, extract_json_object
+
+class Story(BaseModel):
+    story_text: str
+    emotion: str
+    visual_keywords: str
+
+def _validator():
+    return StructuredOutputValidator(
+        Story, aliases={"story": "story_text", "mood": "emotion", "keywords": "visual_keywords"},
+        repair_defaults={"emotion": "neutral", "visual_keywords": ""}
+    )
+
+def test_clean_reply_is_ok():
+    data, outcome = _validator().parse_with_outcome('{"story_text": "A", "emotion": "joy", "visual_keywords": "dawn"}')
+    assert outcome == "ok" and data == {"story_text": "A", "emotion": "joy", "visual_keywords": "dawn"}
+
+def test_code_fences_and_preamble_are_stripped():
+    text = 'Here is your story:\n```json\n{"story_text": "A", "emotion": "joy", "visual_keywords": "dawn"}\n```'
+    data, outcome = _validator().parse_with_outcome(text)
+    assert outcome == "repaired" and data["emotion"] == "joy"
+
+def test_aliases_and_list_coercion():
+    data = _validator().parse('{"Story": "A", "MOOD": "fear", "keywords": ["low angle", "torchlight"]}')
+    assert data == {"story_text": "A", "emotion": "fear", "visual_keywords": "low angle, torchlight"}
+
+def test_truncated_story_text_gets_defaults():
+    data, outcome = _validator().parse_with_outcome(r'{"story_text":"The hero said \"hi')
+    assert outcome == "repaired"
+    assert data == {"story_text": 'The hero said "hi', "emotion": "neutral", "visual_keywords": ""}
+
+@pytest.mark.parametrize("text", [
+    '{"story_text":"abc", "emotion":',
+    '{"story_text":"abc", "emo',
+    '{"story_text":"abc", "emotion"',
+    '{"story_text":"abc",',
+])
+def test_dangling_key_is_dropped(text):
+    assert _validator().parse(text) == {"story_text": "abc", "emotion": "neutral", "visual_keywords": ""}
+
+def test_partial_value_is_kept():
+    assert _validator().parse('{"story_text":"abc", "emotion": "fe')["emotion"] == "fe"
+
+def test_extract_closes_nested_containers():
+    assert extract_json_object('{"a": {"b": ["x", "y') == '{"a": {"b": ["x", "y"]}}'
+
+def test_missing_required_field_and_no_json_fail():
+    with pytest.raises(OutputValidationError):
+        _validator().parse('{"emotion": "joy"}')
+    with pytest.raises(OutputValidationError):
+        _validator().parse("I cannot help with that.")
+
+def test_stats_separate_repairs_from_reasks():
+    validator = _validator()
+    for outcome in ("ok", "repaired", "reask", "failed"):
+        validator.record("model", outcome)
+    stats = validator.get_stats()["model"]
+    assert stats["failure_rate"] == 0.75 and stats["reask_rate"] == 0.5
@@ -0,0 +1,52 @@
+import pytest
+import qos_controller
+from qos_controller import QoSController, QoSLevel
+
+class _FakeScheduler:
+    def __init__(self):
+        self.queue_depth = 0
+
+    def get_stats(self):
+        return {"queue_depth": self.queue_depth}
+
+@pytest.fixture
+def controller(monkeypatch):
+    monkeypatch.setattr(qos_controller, "QOS_QUEUE_DEPTH_THRESHOLDS", (4, 8, 16))
+    monkeypatch.setattr(qos_controller, "QOS_LATENCY_THRESHOLDS", (10.0, 20.0, 30.0))
+    monkeypatch.setattr(qos_controller, "QOS_RECOVERY_RATIO", 0.5)
+    monkeypatch.setattr(qos_controller, "QOS_MIN_DWELL", 0.0)
+    return QoSController(scheduler=_FakeScheduler())
+
+def test_escalates_one_level_per_evaluation(controller):
+    controller.scheduler.queue_depth = 20
+    assert [controller.evaluate() for _ in range(4)] == [
+        QoSLevel.NO_IMAGES, QoSLevel.NO_AUDIO, QoSLevel.REDUCED, QoSLevel.REDUCED
+    ]
+
+def test_latency_alone_escalates(controller):
+    for _ in range(5):
+        controller.record_latency(12.0)
+    assert controller.evaluate() == QoSLevel.NO_IMAGES
+    assert controller.evaluate() == QoSLevel.NO_IMAGES
+
+def test_hysteresis_holds_until_below_recovery_ratio(controller):
+    controller.scheduler.queue_depth = 4
+    assert controller.evaluate() == QoSLevel.NO_IMAGES
+    # Below the entry threshold but above 50% of it: stay shed
+    controller.scheduler.queue_depth = 3
+    assert controller.evaluate() == QoSLevel.NO_IMAGES
+    controller.scheduler.queue_depth = 1
+    assert controller.evaluate() == QoSLevel.NORMAL
+
+def test_min_dwell_blocks_flapping(controller, monkeypatch):
+    monkeypatch.setattr(qos_controller, "QOS_MIN_DWELL", 60.0)
+    controller.scheduler.queue_depth = 20
+    assert controller.evaluate() == QoSLevel.NO_IMAGES
+    assert controller.evaluate() == QoSLevel.NO_IMAGES
+    controller.scheduler.queue_depth = 0
+    assert controller.evaluate() == QoSLevel.NO_IMAGES
+
+def test_stale_latency_samples_are_ignored(controller, monkeypatch):
+    monkeypatch.setattr(qos_controller, "QOS_LATENCY_MAX_AGE", -1.0)
+    controller.record_latency(50.0)
+    assert controller.evaluate() == QoSLevel.NORMAL
@@ -0,0 +1,39 @@
+from scene_change import SceneChangeDetector, scene_signature
+
+STORY = "Arjun walks through the lantern-lit temple courtyard as the monsoon drums begin."
+
+def _scene(tmp_path, signature):
+    image = tmp_path / "scene.webp"
+    image.write_bytes(b"webp")
+    return {"signature": signature, "image": str(image)}
+
+def test_no_previous_scene_renders():
+    decision, score = SceneChangeDetector().decide(None, scene_signature(STORY, "joy", "temple, lanterns"))
+    assert decision == SceneChangeDetector.RENDER and score == 0.0
+
+def test_same_scene_is_reused(tmp_path):
+    signature = scene_signature(STORY, "joy", "temple, lanterns")
+    decision, score = SceneChangeDetector().decide(_scene(tmp_path, signature), dict(signature))
+    assert decision == SceneChangeDetector.REUSE and score == 1.0
+
+def test_partial_change_gets_a_draft_variant(tmp_path):
+    previous = scene_signature(STORY, "joy", "temple, lanterns, dusk")
+    current = scene_signature(STORY, "fear", "temple, lanterns, storm")
+    detector = SceneChangeDetector(reuse_threshold=0.9, variant_threshold=0.5)
+    decision, score = detector.decide(_scene(tmp_path, previous), current)
+    assert decision == SceneChangeDetector.VARIANT and 0.5 <= score < 0.9
+
+def test_new_scene_renders(tmp_path):
+    previous = scene_signature(STORY, "joy", "temple, lanterns")
+    current = scene_signature("A caravan crosses the salt desert under a blood moon.", "fear", "desert, camels, moon")
+    decision, _ = SceneChangeDetector().decide(_scene(tmp_path, previous), current)
+    assert decision == SceneChangeDetector.RENDER
+
+def test_reuse_needs_an_existing_file(tmp_path):
+    signature = scene_signature(STORY, "joy", "temple, lanterns")
+    evicted = {"signature": signature, "image": str(tmp_path / "gone.webp")}
+    in_memory = {"signature": signature, "image": None}
+    detector = SceneChangeDetector()
+    assert detector.decide(evicted, signature)[0] == SceneChangeDetector.VARIANT
+    assert detector.decide(in_memory, signature)[0] == SceneChangeDetector.VARIANT
+    assert detector.stats["variant"] == 2
@@ -0,0 +1,45 @@
+import marshal
+import pytest
+from session_model import SessionState, Character, MoralScores
+
+def _session():
+    character = Character("Meera", "Rajasthani Folklore", age=19, traits=["Kind", "Brave"])
+    session = SessionState("a" * 32, character, "Hindi", MoralScores([3, -2, 0]))
+    session.set_history([("system", "You are a storyteller."), ("human", "Start"), ("ai", '{"story_text": "नमस्ते"}')])
+    session.last_scene = {"signature": {"emotion": "joy", "keywords": ["lantern"], "story": ["temple"]}, "image": "/media/s/scene.webp"}
+    return session
+
+def test_round_trip_preserves_everything():
+    session = _session()
+    restored = SessionState.from_bytes(session.to_bytes())
+    assert restored.session_id == session.session_id and restored.language == "Hindi"
+    assert restored.character.to_dict() == session.character.to_dict()
+    assert restored.scores.to_dict() == {"compassion": 3, "courage": -2, "greed": 0}
+    assert restored.history_records() == session.history_records()
+    assert restored.last_scene == session.last_scene
+
+def test_round_trip_without_scene_or_history():
+    session = SessionState("b" * 32, Character("Kenji", "Japanese History"))
+    restored = SessionState.from_bytes(session.to_bytes())
+    assert restored.history == [] and restored.last_scene is None
+
+def test_in_memory_images_are_not_persisted():
+    session = _session()
+    session.last_scene["image"] = object()
+    assert SessionState.from_bytes(session.to_bytes()).last_scene["image"] is None
+
+def test_rejects_foreign_or_empty_data():
+    blob = _session().to_bytes()
+    with pytest.raises(ValueError):
+        SessionState.from_bytes(b"")
+    with pytest.raises(ValueError):
+        SessionState.from_bytes(bytes((blob[0] + 1,)) + blob[1:])
+    with pytest.raises(ValueError):
+        SessionState.from_bytes(bytes((blob[0], (marshal.version + 1) % 256)) + blob[2:])
+
+def test_scores_are_clamped():
+    scores = MoralScores()
+    scores["courage"] = 99
+    scores["greed"] = -99
+    assert scores.to_dict() == {"compassion": 0, "courage": 10, "greed": -10}
+    assert scores.display() == "Compassion: 0 | Courage: 10 | Greed: -10"
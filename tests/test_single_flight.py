@@ -0,0 +1,137 @@
+import asyncio
+import threading
+import time
+import pytest
+from single_flight import SingleFlight, SingleFlightTimeout
+
+def test_cancelled_leader_hands_over_to_waiter():
+    async def scenario():
+        flight = SingleFlight("test")
+        calls = []
+
+        async def upstream():
+            calls.append(1)
+            await asyncio.sleep(0.2)
+            return "story"
+
+        leader = asyncio.create_task(flight.ado("key", upstream))
+        await asyncio.sleep(0.05)
+        waiter = asyncio.create_task(flight.ado("key", upstream))
+        await asyncio.sleep(0.05)
+
+        leader.cancel()
+        assert await waiter == "story"
+        assert leader.cancelled()
+        assert len(calls) == 2
+        stats = flight.get_stats()
+        assert stats["abandoned"] == 1 and stats["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+def test_concurrent_callers_share_one_upstream_call():
+    async def scenario():
+        flight = SingleFlight("test")
+        calls = []
+
+        async def upstream():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return "story"
+
+        results = await asyncio.gather(*(flight.ado("key", upstream) for _ in range(5)))
+        assert results == ["story"] * 5
+        assert len(calls) == 1
+        stats = flight.get_stats()
+        assert stats["saved"] == 4 and stats["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+def test_leader_error_reaches_waiters():
+    async def scenario():
+        flight = SingleFlight("test")
+
+        async def upstream():
+            await asyncio.sleep(0.1)
+            raise ValueError("provider down")
+
+        results = await asyncio.gather(*(flight.ado("key", upstream) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in results)
+        assert flight.get_stats()["errors"] == 1
+
+    asyncio.run(scenario())
+
+def test_waiter_timeout_does_not_cancel_leader():
+    async def scenario():
+        flight = SingleFlight("test")
+
+        async def upstream():
+            await asyncio.sleep(0.3)
+            return "story"
+
+        leader = asyncio.create_task(flight.ado("key", upstream))
+        await asyncio.sleep(0.02)
+        with pytest.raises(SingleFlightTimeout):
+            await flight.ado("key", upstream, timeout=0.05)
+        assert await leader == "story"
+        assert flight.get_stats()["timeouts"] == 1
+
+    asyncio.run(scenario())
+
+def test_sync_waiter_gets_error_and_times_out():
+    flight = SingleFlight("test")
+    started = threading.Event()
+
+    def slow_failure():
+        started.set()
+        time.sleep(0.2)
+        raise ValueError("provider down")
+
+    leader = threading.Thread(target=lambda: pytest.raises(ValueError, flight.do, "key", slow_failure))
+    leader.start()
+    started.wait()
+    with pytest.raises(ValueError):
+        flight.do("key", slow_failure)
+    leader.join()
+
+    started.clear()
+    leader = threading.Thread(target=lambda: pytest.raises(ValueError, flight.do, "key", slow_failure))
+    leader.start()
+    started.wait()
+    with pytest.raises(SingleFlightTimeout):
+        flight.do("key", slow_failure, timeout=0.05)
+    leader.join()
+
+def test_sync_callers_coalesce_across_threads():
+    flight = SingleFlight("test")
+    calls = []
+    release = threading.Event()
+
+    def upstream():
+        calls.append(1)
+        release.wait(1)
+        return "identity"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", upstream))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ["identity"] * 4 and len(calls) == 1
+
+def test_distinct_keys_and_completed_calls_are_not_shared():
+    flight = SingleFlight("test")
+    calls = []
+
+    def upstream(value):
+        calls.append(value)
+        return value
+
+    assert flight.do("a", lambda: upstream("a")) == "a"
+    assert flight.do("b", lambda: upstream("b")) == "b"
+    # Nothing is cached once a call completes
+    assert flight.do("a", lambda: upstream("a-again")) == "a-again"
+    assert calls == ["a", "b", "a-again"]
+    assert flight.get_stats()["saved"] == 0